@@ -0,0 +1,51 @@
+"""
+Measures the startup cost of the CLI entry point and of the main modules.
+
+Each module is imported in a fresh interpreter, so the numbers include every transitive import.
+The slowest transitive imports are taken from python -X importtime.
+
+Usage:
+    python -m benchmarks.bench_import_time --repeat 5
+"""
+import sys
+import argparse
+import subprocess
+from os.path import dirname
+
+PROJECT_FOLDER = dirname(dirname(__file__))
+MODULES = ["main", "src.pipelines", "src.infra.qdrant", "src.connectors.pgres", "src.llmops"]
+
+def import_time(module, repeat) -> float:
+    code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+    timings = []
+    for _ in range(repeat):
+        result = subprocess.run([sys.executable, "-c", code], cwd=PROJECT_FOLDER, capture_output=True, text=True, check=True)
+        timings.append(float(result.stdout.strip().splitlines()[-1]))
+    return min(timings)
+
+def slowest_imports(module, top) -> list[tuple[int, str]]:
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=PROJECT_FOLDER, capture_output=True, text=True, check=True)
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        entries.append((int(cumulative), name.strip()))
+    return sorted(entries, reverse=True)[:top]
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark module import times")
+    parser.add_argument("--repeat", type=int, default=5, help="Fresh interpreters per module (best is reported)")
+    parser.add_argument("--top", type=int, default=10, help="Number of slowest transitive imports to list for main")
+    args = parser.parse_args()
+
+    print(f"{'module':<24} {'import [s]':>10}")
+    for module in MODULES:
+        print(f"{module:<24} {import_time(module, args.repeat):>10.3f}")
+    print(f"\nSlowest imports of main (cumulative):")
+    for cumulative, name in slowest_imports("main", args.top):
+        print(f"{cumulative / 1e6:>8.3f}s  {name}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+"""
+End-to-end latency benchmark of the text-to-SQL pipeline against local stand-ins.
+
+For every catalog size a fresh process builds a synthetic catalog (tables t0..tN-1 linked by foreign keys)
+in a scratch project folder, indexes it into the local vector store and answers generated questions
+through execute_user_query_batch. Ollama is replaced by the fake server of benchmarks.fake_ollama and the
+SQL execution by a stand-in with a fixed latency, so the numbers measure the pipeline itself.
+With --postgres, scan_databases is measured as well against synthetic tables created in a scratch database
+(it scans every database of the server, so point it to a dedicated one through the DB_* variables).
+
+Reported per size: setup times, latency percentiles per pipeline stage, throughput and peak memory.
+--save-baseline stores the results, --baseline compares a run with them and exits with 1 on regressions.
+
+Usage:
+    python -m benchmarks.bench_pipeline --tables 10 1000 20000 --questions 50 --concurrency 4
+    python -m benchmarks.bench_pipeline --tables 1000 --hash-embeddings --baseline benchmarks/baseline.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import hashlib
+import argparse
+import resource
+import tempfile
+import subprocess
+import tracemalloc
+from os.path import join, dirname
+
+PROJECT_FOLDER = dirname(dirname(os.path.abspath(__file__)))
+# the pipeline answers questions on this database
+BENCH_DATABASE = "dvdrental"
+STAGES = ["cache_lookup", "prepare", "generate", "execute", "total"]
+# metrics where a higher value is better, all others are latencies or sizes
+HIGHER_IS_BETTER = {"throughput_qps"}
+
+class HashingEncoder:
+    """
+    Stand-in for the SentenceTransformer model: deterministic unit vectors derived from the text hash.
+    """
+
+    def __init__(self, dimension=384):
+        self.dimension = dimension
+
+    def encode(self, texts, batch_size=None, show_progress_bar=False):
+        import numpy as np
+        vectors = np.empty((len(texts), self.dimension), dtype=np.float32)
+        for i, text in enumerate(texts):
+            seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+            vector = np.random.default_rng(seed).standard_normal(self.dimension).astype(np.float32)
+            vectors[i] = vector / np.linalg.norm(vector)
+        return vectors
+
+def synthetic_db_info(tables, columns) -> dict:
+    """
+    Database information of tables t0..tN-1 with an id key, integer columns and a foreign key to a parent table.
+    """
+    db_tables = {}
+    for i in range(tables):
+        table_columns = {"id": {"type": "integer", "constraints": ["PK", "NOT NULL"], "description": None}}
+        for j in range(columns):
+            table_columns[f"c{j}"] = {"type": "integer", "constraints": [], "description": None}
+        if i > 0:
+            table_columns["parent_id"] = {"type": "integer", "constraints": [f"FK -> t{(i - 1) // 2}(id)"],
+                                          "description": None}
+        db_tables[f"t{i}"] = {"columns": table_columns, "row_count": 1000}
+    return {BENCH_DATABASE: {"tables": db_tables}}
+
+def synthetic_questions(tables, count, seed=42) -> list[dict]:
+    rng = random.Random(seed)
+    return [{"id": i, "question": f"Show the first rows of table t{rng.randrange(tables)} where c0 is above 5"}
+            for i in range(count)]
+
+def percentile(values, fraction) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def run_size(args) -> dict:
+    """
+    Benchmark one catalog size in this process; the project folder and stand-ins are set up before the
+    pipeline modules are imported, so they pick them up as in a regular run.
+    """
+    scratch = tempfile.mkdtemp(prefix="cerebro_bench_")
+    shutil.copytree(join(PROJECT_FOLDER, "assets"), join(scratch, "assets"))
+    os.environ.update({
+        "VECTOR_STORE": args.vector_store,
+        "SEMANTIC_CACHE": "1" if args.semantic_cache else "0",
+        "RESULT_CACHE": "0",
+        "PIPELINE_CANDIDATES": str(args.candidates),
+    })
+    if args.tracemalloc:
+        tracemalloc.start()
+
+    from benchmarks.fake_ollama import start_fake_ollama
+    server = start_fake_ollama(first_token_latency=args.llm_first_token_latency, token_latency=args.llm_token_latency)
+    os.environ["OLLAMA_URL"] = f"http://127.0.0.1:{server.server_port}"
+
+    import src
+    src.set_project_folder(scratch)
+    import src.infra.qdrant as qdrant
+    if args.hash_embeddings:
+        qdrant.model = HashingEncoder(int(os.getenv("EMBEDDING_DIMENSION", "384")))
+    import src.pipelines as pipelines
+    from src.utils import save_db_info
+    from src.catalog import compile_catalog, save_compiled_catalog
+
+    def execute_stand_in(database, query, max_rows=None, batch_size=None, cancellation=None):
+        time.sleep(args.db_latency)
+        return {"success": True, "columns": ["id", "c0", "c1"], "data": [(i, 6, i) for i in range(10)], "truncated": False}
+    pipelines.execute_sql_query = execute_stand_in
+
+    metrics = {}
+    if args.postgres:
+        metrics["scan_s"] = scan_postgres(args.size, args.columns)
+
+    started = time.perf_counter()
+    db_info = synthetic_db_info(args.size, args.columns)
+    save_db_info(db_info, scratch)
+    save_compiled_catalog(compile_catalog(db_info), scratch)
+    metrics["catalog_build_s"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    qdrant.create_and_store_schema_embeddings(db_info)
+    metrics["index_s"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    pipelines.warm_up()
+    metrics["warm_up_s"] = time.perf_counter() - started
+
+    questions = synthetic_questions(args.size, args.questions)
+    started = time.perf_counter()
+    results = pipelines.execute_user_query_batch(questions, concurrency=args.concurrency)
+    elapsed = time.perf_counter() - started
+    metrics["throughput_qps"] = len(questions) / elapsed
+    metrics["success_rate"] = sum(result["success"] for result in results) / max(len(results), 1)
+    for stage in STAGES:
+        values = [result["timings"][stage] for result in results if "timings" in result]
+        for name, fraction in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99)):
+            metrics[f"{stage}_{name}_ms"] = percentile(values, fraction) * 1000
+    metrics["peak_rss_mb"] = peak_rss_mb()
+    if args.tracemalloc:
+        metrics["python_peak_mb"] = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+
+    server.shutdown()
+    shutil.rmtree(scratch, ignore_errors=True)
+    return metrics
+
+def scan_postgres(tables, columns) -> float:
+    from src.connectors.pgres import scan_databases
+    from benchmarks.bench_table_statistics import recreate_database, create_tables
+    recreate_database()
+    create_tables(0, tables, columns)
+    started = time.perf_counter()
+    scan_databases(filter_builtin_databases=True)
+    return time.perf_counter() - started
+
+def compare(results, baseline, tolerance) -> list[str]:
+    regressions = []
+    print(f"\n{'tables':>7} {'metric':<22} {'baseline':>12} {'current':>12} {'change':>8}")
+    for size, metrics in results.items():
+        for metric, value in metrics.items():
+            reference = baseline.get(size, {}).get(metric)
+            if reference is None or metric == "success_rate":
+                continue
+            change = (value - reference) / reference if reference else 0.0
+            worse = -change if metric in HIGHER_IS_BETTER else change
+            flag = "  REGRESSION" if worse > tolerance else ""
+            if flag:
+                regressions.append(f"{size} tables: {metric}")
+            print(f"{size:>7} {metric:<22} {reference:>12.2f} {value:>12.2f} {change:>+8.1%}{flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the text-to-SQL pipeline end to end")
+    parser.add_argument("--tables", type=int, nargs="+", default=[10, 1000, 20000], help="Catalog sizes to measure")
+    parser.add_argument("--columns", type=int, default=8, help="Columns per synthetic table")
+    parser.add_argument("--questions", type=int, default=50, help="Questions answered per catalog size")
+    parser.add_argument("--concurrency", type=int, default=4, help="Questions answered concurrently")
+    parser.add_argument("--candidates", type=int, default=1, help="Candidate SQLs raced per question (PIPELINE_CANDIDATES)")
+    parser.add_argument("--llm-first-token-latency", type=float, default=0.2, help="Seconds before the first token of the fake Ollama")
+    parser.add_argument("--llm-token-latency", type=float, default=0.01, help="Seconds between tokens of the fake Ollama")
+    parser.add_argument("--db-latency", type=float, default=0.02, help="Seconds per SQL execution of the stand-in")
+    parser.add_argument("--vector-store", choices=["local", "qdrant"], default="local", help="Vector store backend (qdrant uses QDRANT_URL)")
+    parser.add_argument("--hash-embeddings", action="store_true", help="Replace the embedding model with a hashing stand-in")
+    parser.add_argument("--semantic-cache", action="store_true", help="Keep the semantic question cache enabled")
+    parser.add_argument("--postgres", action="store_true", help="Also measure scan_databases on a scratch database")
+    parser.add_argument("--tracemalloc", action="store_true", help="Also report the peak of Python allocations (slows the run down)")
+    parser.add_argument("--baseline", type=str, default=None, help="Baseline JSON file to compare the results with")
+    parser.add_argument("--save-baseline", type=str, default=None, help="Store the results as baseline JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Relative change reported as regression")
+    parser.add_argument("--size", type=int, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.size is not None:
+        print(json.dumps(run_size(args)))
+        return
+
+    results = {}
+    for size in args.tables:
+        # one process per size, so the peak memory and the warm up are measured per catalog size
+        command = [sys.executable, "-m", "benchmarks.bench_pipeline", "--size", str(size)] + sys.argv[1:]
+        completed = subprocess.run(command, cwd=PROJECT_FOLDER, capture_output=True, text=True)
+        if completed.returncode != 0:
+            print(completed.stderr[-4000:], file=sys.stderr)
+            sys.exit(f"Benchmark of {size} tables failed")
+        results[str(size)] = json.loads(completed.stdout.strip().splitlines()[-1])
+
+    metric_names = list(next(iter(results.values())))
+    print(f"{'metric':<22}" + "".join(f"{size + ' tables':>16}" for size in results))
+    for metric in metric_names:
+        print(f"{metric:<22}" + "".join(f"{results[size].get(metric, float('nan')):>16.2f}" for size in results))
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nSaved baseline to {args.save_baseline}")
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            sys.exit(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+
+if __name__ == "__main__":
+    main()
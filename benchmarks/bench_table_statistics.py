@@ -0,0 +1,96 @@
+"""
+Benchmark of extract_table_statistics against the previous per-table (N+1) extraction.
+
+Creates a scratch database with a growing number of synthetic tables, analyzes it and measures
+how the extraction time grows with the table count. Requires a reachable PostgreSQL server
+configured through the usual DB_* environment variables (or the project .env file).
+
+Usage:
+    python -m benchmarks.bench_table_statistics --tables 10 100 1000 --columns 8
+"""
+import argparse
+import time
+from os.path import join, dirname
+import psycopg2
+from dotenv import load_dotenv
+from src.connectors.pgres import get_db_connection_params, extract_table_statistics
+
+BENCH_DATABASE = "cerebro_bench_stats"
+
+LEGACY_COLUMN_STATS_QUERY = """
+    SELECT
+        a.attname, pg_stats.n_distinct, pg_stats.null_frac, pg_stats.avg_width, pg_stats.correlation,
+        pg_stats.most_common_vals, pg_stats.most_common_freqs, pg_stats.histogram_bounds
+    FROM pg_stats
+    JOIN pg_attribute a ON pg_stats.attname = a.attname
+    WHERE pg_stats.schemaname = %s AND pg_stats.tablename = %s
+        AND a.attnum > 0 AND NOT a.attisdropped
+    ORDER BY a.attnum;
+"""
+
+def recreate_database():
+    conn = psycopg2.connect(**get_db_connection_params())
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(f"DROP DATABASE IF EXISTS {BENCH_DATABASE}")
+            cursor.execute(f"CREATE DATABASE {BENCH_DATABASE}")
+    finally:
+        conn.close()
+
+def create_tables(start, end, columns):
+    conn = psycopg2.connect(**get_db_connection_params(database=BENCH_DATABASE))
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cursor:
+            for i in range(start, end):
+                column_defs = ", ".join(f"c{j} integer" for j in range(columns))
+                cursor.execute(f"CREATE TABLE t{i} (id serial PRIMARY KEY, {column_defs})")
+                values = ", ".join(f"(g + {j}) % 17" for j in range(columns))
+                cursor.execute(f"INSERT INTO t{i} ({', '.join(f'c{j}' for j in range(columns))}) "
+                               f"SELECT {values} FROM generate_series(1, 50) g")
+            cursor.execute("ANALYZE")
+    finally:
+        conn.close()
+
+def legacy_extract_table_statistics(database):
+    conn = psycopg2.connect(**get_db_connection_params(database=database))
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT schemaname, relname FROM pg_stat_user_tables")
+            for schema_name, table_name in cursor.fetchall():
+                cursor.execute(LEGACY_COLUMN_STATS_QUERY, (schema_name, table_name))
+                cursor.fetchall()
+    finally:
+        conn.close()
+
+def timed(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark table statistics extraction")
+    parser.add_argument("--tables", type=int, nargs="+", default=[10, 100, 1000], help="Table counts to measure")
+    parser.add_argument("--columns", type=int, default=8, help="Columns per synthetic table")
+    parser.add_argument("--repeat", type=int, default=3, help="Repetitions per measurement (best is reported)")
+    parser.add_argument("--skip-legacy", action="store_true", help="Only measure the set-based extractor")
+    args = parser.parse_args()
+    load_dotenv(join(dirname(dirname(__file__)), '.env'))
+
+    recreate_database()
+    created = 0
+    print(f"{'tables':>8} {'set-based [s]':>14} {'per-table [s]':>14}")
+    for table_count in sorted(args.tables):
+        create_tables(created, table_count, args.columns)
+        created = table_count
+        set_based = timed(lambda: extract_table_statistics(BENCH_DATABASE), args.repeat)
+        legacy = None if args.skip_legacy else timed(lambda: legacy_extract_table_statistics(BENCH_DATABASE), args.repeat)
+        legacy_text = "-" if legacy is None else f"{legacy:.3f}"
+        print(f"{table_count:>8} {set_based:>14.3f} {legacy_text:>14}")
+
+if __name__ == "__main__":
+    main()
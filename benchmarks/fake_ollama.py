@@ -0,0 +1,124 @@
+"""
+Local stand-in for the Ollama API used by the benchmarks.
+
+Serves /api/generate (streamed NDJSON or a single JSON response) and /api/embeddings with configurable
+latencies. Generations get canned answers: the question of a query improvement prompt is returned as is,
+and SQL prompts are answered with a SQL block over the table named in the question ("... table t42 ..."),
+followed by an explanation the client is expected to cut off. Stop sequences are honored like Ollama does.
+
+Usage:
+    python -m benchmarks.fake_ollama --port 11435 --first-token-latency 0.2 --token-latency 0.01
+"""
+import re
+import json
+import time
+import hashlib
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+USER_QUERY_PATTERN = re.compile(r"<USER_QUERY>\s*(.*?)\s*</USER_QUERY>", re.DOTALL)
+TABLE_PATTERN = re.compile(r"\btable (t\d+)\b")
+EXPLANATION = "\n\nThis query reads the requested columns of the table and limits the number of returned rows."
+
+def canned_response(payload) -> str:
+    prompt = payload.get("prompt", "")
+    if not payload.get("system"):
+        match = USER_QUERY_PATTERN.search(prompt)
+        return match.group(1) if match else prompt[-200:]
+    match = TABLE_PATTERN.search(prompt)
+    table = match.group(1) if match else "t0"
+    return f"```sql\nSELECT id, c0, c1 FROM {table} WHERE c0 > 5 ORDER BY id LIMIT 10;\n```{EXPLANATION}"
+
+def tokens(text, size=4):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    first_token_latency = 0.2
+    token_latency = 0.01
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if self.path == "/api/generate":
+            self.generate(payload)
+        elif self.path == "/api/embeddings":
+            digest = hashlib.sha256(payload.get("prompt", "").encode("utf-8")).digest()
+            self.send_json({"embedding": [byte / 255 for byte in digest] * 12})
+        else:
+            self.send_error(404)
+
+    def send_json(self, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def generate(self, payload):
+        text = canned_response(payload)
+        stops = (payload.get("options") or {}).get("stop") or []
+        done_reason = "stop"
+        for stop in stops:
+            position = text.find(stop)
+            if position >= 0:
+                text = text[:position]
+        parts = tokens(text)
+        context = [len(text)]
+        time.sleep(self.first_token_latency)
+        if not payload.get("stream", True):
+            time.sleep(self.token_latency * len(parts))
+            self.send_json({"response": text, "context": context, "done": True, "done_reason": done_reason,
+                            "prompt_eval_count": len(payload.get("prompt", "")) // 4, "eval_count": len(parts)})
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for part in parts:
+                self.write_chunk({"response": part, "done": False})
+                time.sleep(self.token_latency)
+            self.write_chunk({"response": "", "done": True, "done_reason": done_reason, "context": context,
+                              "prompt_eval_count": len(payload.get("prompt", "")) // 4, "eval_count": len(parts)})
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # the client stopped reading, as Ollama the generation is aborted
+            self.close_connection = True
+
+    def write_chunk(self, body):
+        data = (json.dumps(body) + "\n").encode("utf-8")
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+def start_fake_ollama(port=0, first_token_latency=0.2, token_latency=0.01) -> ThreadingHTTPServer:
+    """
+    Start the fake Ollama server on a background thread and return it; its URL is http://127.0.0.1:<server_port>.
+    """
+    handler = type("ConfiguredFakeOllamaHandler", (FakeOllamaHandler,),
+                   {"first_token_latency": first_token_latency, "token_latency": token_latency})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="fake-ollama", daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a fake Ollama API server")
+    parser.add_argument("--port", type=int, default=11435, help="Port to listen on")
+    parser.add_argument("--first-token-latency", type=float, default=0.2, help="Seconds before the first token")
+    parser.add_argument("--token-latency", type=float, default=0.01, help="Seconds between streamed tokens")
+    args = parser.parse_args()
+    server = start_fake_ollama(args.port, args.first_token_latency, args.token_latency)
+    print(f"Fake Ollama listening on http://127.0.0.1:{server.server_port}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
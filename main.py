@@ -1,19 +1,20 @@
 import os
 import traceback
 import json
+import sys
 import argparse
 import logging
 from src.connectors.pgres import scan_databases
 from os.path import join, dirname
-import streamlit as st
 import json
 from tabulate import tabulate
 from dotenv import load_dotenv
 from src import set_project_folder
-from src.infra.qdrant import create_and_store_schema_embeddings
-from src.utils import save_db_info
-from src.connectors.pgres import scan_databases
-from src.pipelines import execute_user_query_pipleline
+from src.infra.qdrant import create_and_store_schema_embeddings, delete_schema_embeddings
+from src.utils import save_db_info, load_all_db_info, delete_db_info
+from src.catalog import compile_catalog, save_compiled_catalog
+from src.connectors.pgres import scan_databases, refresh_databases
+from src.pipelines import execute_user_query_pipleline, execute_user_query_batch
 
 project_folder = dirname(__file__)
 set_project_folder(project_folder)
@@ -119,6 +120,33 @@ load_dotenv(join(project_folder, '.env'))
 #                 st.bar_chart(bookmark['chart_data'].set_index(bookmark['chart_data'].columns[0]))
 
 
+def read_questions(lines) -> list[dict]:
+    """
+    Read batch questions, one JSON object with a 'question' (and optionally an 'id') or plain question per line.
+    Lines that are not valid JSON or have no 'question' string are kept with an 'error', so they are reported
+    as failed results instead of aborting the batch.
+    """
+    questions = []
+    with lines:
+        for line_number, line in enumerate(lines, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            if not line.startswith("{"):
+                questions.append({"question": line})
+                continue
+            try:
+                question = json.loads(line)
+            except json.JSONDecodeError as e:
+                questions.append({"error": f"Line {line_number} is not valid JSON: {e}"})
+                continue
+            if not isinstance(question, dict):
+                question = {"error": f"Line {line_number} is not a JSON object"}
+            elif not isinstance(question.get("question"), str) or not question["question"].strip():
+                question["error"] = f"Line {line_number} has no 'question' string"
+            questions.append(question)
+    return questions
+
 def main():
     parser = argparse.ArgumentParser(description="Database management tool")
     subparsers = parser.add_subparsers(dest="action", help="Specify the action to perform")
@@ -126,20 +154,61 @@ def main():
     # Scan action
     scan_parser = subparsers.add_parser("scan", help="Scan databases")
     scan_parser.add_argument("data_source", choices=["pgsql"], help="Specify the database type")
+    scan_parser.add_argument("--workers", type=int, default=None, help="Number of databases scanned in parallel")
+    scan_parser.add_argument("--executor", choices=["thread", "process"], default=None, help="Worker pool type used for parallel scans")
+    scan_parser.add_argument("--incremental", action="store_true", help="Only re-extract and re-embed tables whose schema changed since the last scan; "
+                             "the statistics (row counts, sizes, column statistics) of the other tables are kept as they were")
+    scan_parser.add_argument("--change-counters", action="store_true", help="With --incremental, also treat row modifications as changes, "
+                             "which refreshes the statistics of the modified tables")
+    scan_parser.add_argument("--export-json", action="store_true", help="Also export the catalog as data/<database>_info.json files")
 
     # Query action
     query_parser = subparsers.add_parser("query", help="Query databases")
-    query_parser.add_argument("query", type=str, help="Specify the query string")
+    query_parser.add_argument("query", type=str, nargs="?", help="Specify the query string")
+    query_parser.add_argument("--file", type=str, default=None, help="Answer the questions of a JSONL file (- for stdin), one {\"question\": ...} object or plain question per line")
+    query_parser.add_argument("--concurrency", type=int, default=None, help="With --file, number of questions answered concurrently")
+    query_parser.add_argument("--output", type=str, default=None, help="With --file, JSONL file receiving the result of each question (default: stdout)")
 
     args = parser.parse_args()
-    if args.action == "scan" and args.data_source == "pgsql":
-        db_info = scan_databases(filter_builtin_databases=False, print_results=True)
-        save_db_info(db_info, project_folder)
+    if args.action == "scan" and args.data_source == "pgsql" and args.incremental:
+        previous_db_info = load_all_db_info(project_folder)
+        db_info, changes = refresh_databases(previous_db_info, filter_builtin_databases=False,
+                                             include_change_counters=args.change_counters,
+                                             max_workers=args.workers, executor=args.executor)
+        save_db_info({db_name: db_info[db_name] for db_name in changes if db_name in db_info}, project_folder,
+                     export_json=args.export_json)
+        for db_name, db_changes in changes.items():
+            if db_name not in db_info:
+                delete_db_info(db_name, project_folder)
+            delete_schema_embeddings(db_name, db_changes['removed'])
+        if changes:
+            save_compiled_catalog(compile_catalog(db_info), project_folder)
+        create_and_store_schema_embeddings(db_info, tables={db_name: db_changes['changed'] for db_name, db_changes in changes.items()})
+    elif args.action == "scan" and args.data_source == "pgsql":
+        db_info = scan_databases(filter_builtin_databases=False, print_results=True,
+                                 max_workers=args.workers, executor=args.executor)
+        save_db_info(db_info, project_folder, export_json=args.export_json)
+        save_compiled_catalog(compile_catalog(db_info), project_folder)
         create_and_store_schema_embeddings(db_info)
+    elif args.action == "query" and args.file:
+        questions = read_questions(sys.stdin if args.file == "-" else open(args.file, 'r'))
+        output = open(args.output, 'w') if args.output else sys.stdout
+
+        def write_result(result):
+            output.write(json.dumps(result, default=str) + "\n")
+            output.flush()
+
+        try:
+            results = execute_user_query_batch(questions, concurrency=args.concurrency, on_result=write_result)
+        finally:
+            if args.output:
+                output.close()
+        logger.info(f"Answered {sum(result['success'] for result in results)} of {len(results)} questions successfully")
     elif args.action == "query" and args.query:
         execute_user_query_pipleline(args.query)
     else:
         # Run the default Streamlit app if no command-line arguments are provided
+        import streamlit as st
         st.set_page_config(page_title="Data Insight Generator", layout="wide")
 if __name__ == "__main__":
     try:
@@ -0,0 +1,125 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+from src.utils import load_all_db_info, table_info_to_ddl
+from src.lexical_index import build_lexical_index
+
+logger = logging.getLogger(__name__)
+
+COMPILED_CATALOG_FILE = "catalog.compiled.json"
+# bumped whenever compile_catalog adds or changes entries, older artifacts are recompiled on load
+COMPILED_CATALOG_FORMAT = 5
+
+_compiled_catalog_cache = {}
+_compiled_catalog_lock = threading.Lock()
+
+def compile_catalog(all_db_info) -> dict:
+    """
+    Compile the scanned database information into the artifact used at query time.
+
+    Args:
+    all_db_info (dict): The database information of all databases, keyed by database name.
+
+    Returns:
+    dict: The compiled catalog with the DDL per table ('tables', keyed by '<database>.<table>'),
+    the DDL per database ('databases'), the tables referenced by the foreign keys of each table
+    ('foreign_keys'), the column names of each table ('columns'), the BM25 index of the tables
+    ('lexical', see build_lexical_index) and a 'version' hash of the DDL.
+    """
+    tables = {}
+    databases = {}
+    foreign_keys = {}
+    columns = {}
+    for db_name, db_info in sorted(all_db_info.items()):
+        db_ddl = []
+        for table_name, table_info in db_info['tables'].items():
+            table_key = f"{db_name}.{table_name}"
+            table_ddl = table_info_to_ddl(db_name, table_name, table_info)
+            tables[table_key] = table_ddl
+            columns[table_key] = list(table_info['columns'])
+            db_ddl.append(table_ddl)
+            referenced = []
+            for column_info in table_info['columns'].values():
+                for constraint in column_info.get('constraints') or []:
+                    if constraint.startswith("FK"):
+                        _, fk_info = constraint.split(" -> ")
+                        foreign_table, _ = fk_info.strip("()").split("(")
+                        if foreign_table not in referenced:
+                            referenced.append(foreign_table)
+            if referenced:
+                foreign_keys[table_key] = [f"{db_name}.{foreign_table}" for foreign_table in referenced]
+        databases[db_name] = "\n".join(db_ddl)
+
+    version = hashlib.sha256()
+    for key, table_ddl in sorted(tables.items()):
+        version.update(key.encode('utf-8'))
+        version.update(table_ddl.encode('utf-8'))
+    return {
+        'format': COMPILED_CATALOG_FORMAT,
+        'version': version.hexdigest(),
+        'tables': tables,
+        'databases': databases,
+        'foreign_keys': foreign_keys,
+        'columns': columns,
+        'lexical': build_lexical_index(all_db_info),
+    }
+
+def save_compiled_catalog(catalog, project_folder):
+    """
+    Save the compiled catalog into the data folder of the project.
+
+    Args:
+    catalog (dict): The catalog produced by compile_catalog.
+    project_folder (str): The path to the project folder.
+    """
+    data_folder = os.path.join(project_folder, 'data')
+    os.makedirs(data_folder, exist_ok=True)
+    file_path = os.path.join(data_folder, COMPILED_CATALOG_FILE)
+    tmp_path = f"{file_path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(catalog, f)
+    os.replace(tmp_path, file_path)
+    logger.debug(f"Saved compiled catalog {catalog['version'][:12]} with {len(catalog['tables'])} table(s) to {file_path}")
+
+def load_compiled_catalog(project_folder) -> dict:
+    """
+    Load the compiled catalog, reusing the in-process copy as long as the file is unchanged.
+    If no compiled catalog exists yet, it is compiled from the saved database information and saved.
+
+    Args:
+    project_folder (str): The path to the project folder.
+
+    Returns:
+    dict: The compiled catalog, extended with the 'full_schema' DDL of all databases and the
+    'relations' of each table (the tables it references and the tables referencing it).
+    """
+    file_path = os.path.join(project_folder, 'data', COMPILED_CATALOG_FILE)
+    with _compiled_catalog_lock:
+        if not os.path.exists(file_path):
+            logger.warning(f"No compiled catalog found at {file_path}, compiling it from the saved database information")
+            save_compiled_catalog(compile_catalog(load_all_db_info(project_folder)), project_folder)
+
+        mtime = os.stat(file_path).st_mtime_ns
+        cached = _compiled_catalog_cache.get(file_path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+
+        with open(file_path, 'r') as f:
+            catalog = json.load(f)
+        if catalog.get('format') != COMPILED_CATALOG_FORMAT:
+            logger.info(f"Recompiling outdated catalog artifact {file_path}")
+            catalog = compile_catalog(load_all_db_info(project_folder))
+            save_compiled_catalog(catalog, project_folder)
+            mtime = os.stat(file_path).st_mtime_ns
+        catalog['full_schema'] = "\n".join(catalog['databases'].values())
+        relations = {}
+        for table_key, referenced_keys in catalog['foreign_keys'].items():
+            for referenced_key in referenced_keys:
+                relations.setdefault(table_key, []).append(referenced_key)
+                relations.setdefault(referenced_key, []).append(table_key)
+        catalog['relations'] = relations
+        _compiled_catalog_cache[file_path] = (mtime, catalog)
+        logger.debug(f"Loaded compiled catalog {catalog['version'][:12]} with {len(catalog['tables'])} table(s)")
+        return catalog
@@ -0,0 +1,178 @@
+import os
+import json
+import struct
+import logging
+from collections.abc import Mapping
+import msgpack
+
+logger = logging.getLogger(__name__)
+
+# Binary catalog file layout, one file per database:
+#   MAGIC | uint64 index length | msgpack index | table blobs
+# The index holds the database level entries and, per table, the offset and length (relative to the end
+# of the index) of a schema blob and of a statistics blob. Column statistics (histograms, most common
+# values) are kept apart, so reading the schema of a table doesn't decode them.
+MAGIC = b"CRBCAT1\n"
+HEADER = struct.Struct("<Q")
+BINARY_SUFFIX = "_info.msgpack"
+JSON_SUFFIX = "_info.json"
+STATISTIC_KEYS = ('n_distinct', 'null_fraction', 'avg_width', 'correlation', 'most_common_values', 'histogram_bounds')
+
+def pack(value) -> bytes:
+    return msgpack.packb(value, default=str, use_bin_type=True)
+
+def unpack(data: bytes):
+    return msgpack.unpackb(data, raw=False, strict_map_key=False)
+
+def split_table_info(table_info) -> tuple[dict, dict]:
+    """
+    Split a table entry into its schema part and its per-column statistics.
+    """
+    schema = {key: value for key, value in table_info.items() if key != 'columns'}
+    schema['columns'] = {}
+    statistics = {}
+    for column_name, column_info in table_info.get('columns', {}).items():
+        schema['columns'][column_name] = {key: value for key, value in column_info.items() if key not in STATISTIC_KEYS}
+        column_statistics = {key: column_info[key] for key in STATISTIC_KEYS if key in column_info}
+        if column_statistics:
+            statistics[column_name] = column_statistics
+    return schema, statistics
+
+def write_binary_db_info(db_info, file_path):
+    """
+    Write the information of one database to a binary catalog file.
+
+    Args:
+    db_info (dict): The database information, as produced by scan_database.
+    file_path (str): The path of the file to write.
+    """
+    blobs = []
+    offset = 0
+    tables_index = {}
+    for table_name, table_info in db_info.get('tables', {}).items():
+        schema, statistics = split_table_info(table_info)
+        schema_blob, statistics_blob = pack(schema), pack(statistics)
+        tables_index[table_name] = [offset, len(schema_blob), offset + len(schema_blob), len(statistics_blob)]
+        offset += len(schema_blob) + len(statistics_blob)
+        blobs.extend((schema_blob, statistics_blob))
+    index = pack({
+        'database': {key: value for key, value in db_info.items() if key != 'tables'},
+        'tables': tables_index,
+    })
+
+    tmp_path = f"{file_path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(HEADER.pack(len(index)))
+        f.write(index)
+        for blob in blobs:
+            f.write(blob)
+    os.replace(tmp_path, file_path)
+
+class LazyTables(Mapping):
+    """
+    Read-only mapping of table name to table information, decoding each table from the file on first access.
+    """
+
+    def __init__(self, file_path, data_offset, tables_index):
+        self._file_path = file_path
+        self._data_offset = data_offset
+        self._index = tables_index
+        self._cache = {}
+
+    def _read(self, offset, length):
+        with open(self._file_path, 'rb') as f:
+            f.seek(self._data_offset + offset)
+            return unpack(f.read(length))
+
+    def get_table(self, table_name, with_statistics=True) -> dict:
+        """
+        Decode a single table; with_statistics=False skips the column statistics blob.
+        """
+        if with_statistics and table_name in self._cache:
+            return self._cache[table_name]
+        schema_offset, schema_length, statistics_offset, statistics_length = self._index[table_name]
+        table_info = self._read(schema_offset, schema_length)
+        if not with_statistics:
+            return table_info
+        for column_name, column_statistics in self._read(statistics_offset, statistics_length).items():
+            table_info['columns'].setdefault(column_name, {}).update(column_statistics)
+        self._cache[table_name] = table_info
+        return table_info
+
+    def __getitem__(self, table_name):
+        return self.get_table(table_name)
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __len__(self):
+        return len(self._index)
+
+class LazyDatabaseInfo(Mapping):
+    """
+    Read-only view of a database entry of a binary catalog file. Only the file header and index are read
+    when the entry is opened; tables are decoded on access through the 'tables' mapping.
+    """
+
+    def __init__(self, file_path):
+        with open(file_path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"Not a binary catalog file: {file_path}")
+            (index_length,) = HEADER.unpack(f.read(HEADER.size))
+            index = unpack(f.read(index_length))
+        self._entries = dict(index['database'])
+        self._entries['tables'] = LazyTables(file_path, len(MAGIC) + HEADER.size + index_length, index['tables'])
+
+    def __getitem__(self, key):
+        return self._entries[key]
+
+    def __iter__(self):
+        return iter(self._entries)
+
+    def __len__(self):
+        return len(self._entries)
+
+class LazyCatalog(Mapping):
+    """
+    Read-only mapping of database name to database information over the data folder.
+    Databases saved in the binary format are opened on first access; databases that only have a
+    JSON file (saved by earlier versions or exported) are parsed on first access.
+    """
+
+    def __init__(self, data_folder):
+        self._data_folder = data_folder
+        self._files = {}
+        self._cache = {}
+        if os.path.exists(data_folder):
+            for filename in sorted(os.listdir(data_folder)):
+                if filename.endswith(BINARY_SUFFIX):
+                    self._files[filename[:-len(BINARY_SUFFIX)]] = os.path.join(data_folder, filename)
+            for filename in sorted(os.listdir(data_folder)):
+                if filename.endswith(JSON_SUFFIX):
+                    self._files.setdefault(filename[:-len(JSON_SUFFIX)], os.path.join(data_folder, filename))
+
+    def __getitem__(self, db_name):
+        if db_name not in self._cache:
+            file_path = self._files[db_name]
+            if file_path.endswith(BINARY_SUFFIX):
+                self._cache[db_name] = LazyDatabaseInfo(file_path)
+            else:
+                with open(file_path, 'r') as f:
+                    self._cache[db_name] = json.load(f)
+            logger.debug(f"Opened database info for {db_name} from {file_path}")
+        return self._cache[db_name]
+
+    def __iter__(self):
+        return iter(self._files)
+
+    def __len__(self):
+        return len(self._files)
+
+def to_dict(db_info) -> dict:
+    """
+    Materialize a (lazy) database entry into plain dictionaries, e.g. for a JSON export.
+    """
+    if isinstance(db_info, Mapping):
+        return {key: to_dict(value) for key, value in db_info.items()}
+    return db_info
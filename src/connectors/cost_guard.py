@@ -0,0 +1,94 @@
+import os
+import json
+import logging
+import psycopg2
+
+logger = logging.getLogger(__name__)
+
+class QueryRejectedError(Exception):
+    """
+    Raised when the estimated cost of a query exceeds the limits of the cost guard.
+    """
+
+def get_cost_guard_settings() -> dict:
+    """
+    Resolve the cost guard settings: COST_GUARD (on by default), COST_GUARD_MAX_COST (planner cost units),
+    COST_GUARD_MAX_ROWS (estimated rows of queries read without a row cap) and COST_GUARD_AUTO_LIMIT.
+    """
+    return {
+        'enabled': os.getenv('COST_GUARD', '1') != '0',
+        'max_cost': float(os.getenv('COST_GUARD_MAX_COST', '10000000')),
+        'max_rows': float(os.getenv('COST_GUARD_MAX_ROWS', '1000000')),
+        'auto_limit': os.getenv('COST_GUARD_AUTO_LIMIT', '1') != '0',
+    }
+
+def get_statement_timeout(statement_timeout=None) -> int:
+    """
+    Resolve the statement timeout in milliseconds, falling back to QUERY_STATEMENT_TIMEOUT (60000). 0 disables it.
+    """
+    return int(statement_timeout if statement_timeout is not None else os.getenv('QUERY_STATEMENT_TIMEOUT', '60000'))
+
+def explain(cursor, query) -> tuple[float, float]:
+    """
+    Return the estimated total cost and rows of the top plan node of a query, without running it.
+    """
+    cursor.execute(f"EXPLAIN (FORMAT JSON) {query}")
+    plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    top = plan[0]['Plan']
+    return float(top['Total Cost']), float(top['Plan Rows'])
+
+def limit_query(query, limit) -> str:
+    # the line breaks keep a trailing line comment from swallowing the closing parenthesis
+    return f"SELECT * FROM (\n{query.strip().rstrip(';')}\n) AS cost_guard_limited LIMIT {int(limit)}"
+
+def admit_query(conn, query, max_rows) -> str:
+    """
+    Check the plan estimates of a row returning query before it runs.
+
+    A query estimated to return more rows than will be read (max_rows) gets a LIMIT of max_rows + 1, which
+    lets the planner choose a plan for the first rows without changing what is read, including the detection
+    of truncated results. The query is rejected if its estimated cost still exceeds the maximum cost, or if
+    it is read without a row cap and estimated to return more than the maximum rows.
+
+    Args:
+    conn: The connection the query will run on, inside the same transaction.
+    query (str): The query to check.
+    max_rows (int): Maximum number of rows read from the result; 0 means unlimited.
+
+    Returns:
+    str: The query to execute, limited if it was worth it.
+
+    Raises:
+    QueryRejectedError: With a message asking for a cheaper query.
+    """
+    settings = get_cost_guard_settings()
+    if not settings['enabled']:
+        return query
+    with conn.cursor() as cursor:
+        cost, rows = explain(cursor, query)
+        if max_rows and rows > max_rows and settings['auto_limit']:
+            limited_query = limit_query(query, max_rows + 1)
+            cursor.execute("SAVEPOINT cost_guard")
+            try:
+                limited_cost, limited_rows = explain(cursor, limited_query)
+            except psycopg2.Error as e:
+                cursor.execute("ROLLBACK TO SAVEPOINT cost_guard")
+                logger.debug(f"Running the query without a LIMIT, the limited query can't be planned: {e}")
+            else:
+                logger.info(f"Cost guard added LIMIT {max_rows + 1} to a query estimated to return {rows:.0f} rows, "
+                            f"estimated cost {cost:.0f} -> {limited_cost:.0f}")
+                query, cost, rows = limited_query, limited_cost, limited_rows
+            cursor.execute("RELEASE SAVEPOINT cost_guard")
+
+    if cost > settings['max_cost']:
+        raise QueryRejectedError(
+            f"Query rejected by the cost guard: its estimated cost {cost:.0f} exceeds the limit of "
+            f"{settings['max_cost']:.0f} (about {rows:.0f} rows). Write a cheaper query: join the tables on their keys, "
+            f"avoid cross joins and filter with selective WHERE conditions.")
+    if not max_rows and rows > settings['max_rows']:
+        raise QueryRejectedError(
+            f"Query rejected by the cost guard: it is estimated to return {rows:.0f} rows, more than the limit of "
+            f"{settings['max_rows']:.0f}. Write a query returning fewer rows, e.g. aggregate or filter the result.")
+    return query
@@ -1,8 +1,20 @@
 import psycopg2
 from psycopg2 import sql
 import os
+import re
+import csv
 import json
+import time
+import uuid
 import logging
+import threading
+from contextlib import contextmanager, nullcontext
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from psycopg2.pool import PoolError
+from .pool import get_pool
+from .result_cache import ResultCache, SQL_TOKEN_PATTERN, normalize_sql, is_cacheable
+from .cost_guard import QueryRejectedError, admit_query, get_statement_timeout
+from src import telemetry
 
 # Set up logging
 logger = logging.getLogger(__name__)
@@ -26,12 +38,18 @@ def create_connection():
     conn_params = get_db_connection_params()
     return psycopg2.connect(**conn_params)
 
+def get_connection(database=None):
+    """
+    Borrow a connection to the specified database from the shared connection pool.
+    Use as a context manager; the connection is returned to the pool at the end of the block.
+    """
+    return get_pool(get_db_connection_params(database=database)).connection()
+
 def extract_databases(filter_builtin_databases=True, print_results=False) -> list[str]:
     """
     Extract non-system databases from PostgreSQL.
     """
-    conn = create_connection()
-    try:
+    with get_connection() as conn:
         with conn.cursor() as cursor:
             filter = " AND datname NOT IN ('postgres', 'template0', 'template1')" if filter_builtin_databases else ""
             cursor.execute(f"""
@@ -42,18 +60,25 @@ def extract_databases(filter_builtin_databases=True, print_results=False) -> lis
             if print_results:
                 print(f"Databases: {databases}")
             return databases
-    finally:
-        conn.close()
 
-def extract_schema(database, print_results=False) -> dict:
+def table_filter(condition, tables):
+    """
+    Build an optional SQL condition restricting a catalog query to the given tables.
+    """
+    if tables is None:
+        return sql.SQL("")
+    return sql.SQL(condition).format(sql.Literal(list(tables)))
+
+def extract_schema(database, print_results=False, tables=None) -> dict:
     """
     Extract schema information for the specified database.
-    Returns a dictionary containing the schema information for all tables.
+    Returns a dictionary containing the schema information for all tables,
+    or only for the given tables when a list of table names is provided.
     """
-    conn_params = get_db_connection_params(database=database)
-    conn = psycopg2.connect(**conn_params)
+    if tables is not None and len(tables) == 0:
+        return {}
     schema_info = {}
-    try:
+    with get_connection(database) as conn:
         with conn.cursor() as cursor:
             schema_query = sql.SQL("""
                 SELECT 
@@ -92,11 +117,11 @@ def extract_schema(database, print_results=False) -> dict:
                     JOIN information_schema.constraint_column_usage ccu ON rc.unique_constraint_name = ccu.constraint_name
                 ) fk ON c.table_name = fk.table_name AND c.column_name = fk.column_name
                 WHERE 
-                    c.table_schema = 'public'
+                    c.table_schema = 'public' {table_filter}
                 ORDER BY 
                     c.table_name, 
                     c.ordinal_position;
-            """)
+            """).format(table_filter=table_filter("AND c.table_name::text = ANY({})", tables))
 
             cursor.execute(schema_query)
             results = cursor.fetchall()
@@ -138,48 +163,75 @@ def extract_schema(database, print_results=False) -> dict:
                     if description:
                         print(f"  Description: {description}")
                     print("  ---")
-    finally:
-        conn.close()
     
     return schema_info
 
-def extract_table_statistics(database, print_results=False):
+TABLE_STATISTICS_QUERY = sql.SQL("""
+    SELECT
+        schemaname AS db_name,
+        relname AS table_name,
+        n_live_tup AS row_count,
+        pg_size_pretty(pg_total_relation_size(relid)) AS total_size,
+        pg_size_pretty(pg_table_size(relid)) AS table_size,
+        pg_size_pretty(pg_indexes_size(relid)) AS index_size
+    FROM
+        pg_stat_user_tables
+    {table_filter}
+    ORDER BY
+        n_live_tup DESC;
+""")
+
+# pg_stats is keyed by (schemaname, tablename, attname), so it is matched to the table through
+# pg_stat_user_tables and to the column through pg_attribute joined on the table OID.
+COLUMN_STATISTICS_QUERY = sql.SQL("""
+    SELECT
+        t.relname AS table_name,
+        a.attname AS column_name,
+        s.n_distinct,
+        s.null_frac,
+        s.avg_width,
+        s.correlation,
+        s.most_common_vals,
+        s.most_common_freqs,
+        s.histogram_bounds
+    FROM
+        pg_stat_user_tables t
+    JOIN
+        pg_attribute a ON a.attrelid = t.relid
+    JOIN
+        pg_stats s ON s.schemaname = t.schemaname
+                  AND s.tablename = t.relname
+                  AND s.attname = a.attname
+    WHERE
+        a.attnum > 0 AND NOT a.attisdropped {table_filter}
+    ORDER BY
+        t.relname,
+        a.attnum;
+""")
+
+def extract_table_statistics(database, print_results=False, tables=None):
     """
     Extracts table statistics from the specified database, including distribution boundaries.
+    The table and column statistics of the whole database are fetched with two set-based queries
+    and assembled per table in Python.
     
     Args:
     database (str): The name of the database to extract statistics from.
     print_results (bool): Whether to print the results to console.
+    tables (list): Optional list of table names to restrict the extraction to.
     
     Returns:
     dict: A dictionary containing table statistics.
     """
-    conn_params = get_db_connection_params()
-    conn_params['dbname'] = database
+    if tables is not None and len(tables) == 0:
+        return {}
     statistics = {}
     
-    try:
-        conn = psycopg2.connect(**conn_params)
+    with get_connection(database) as conn:
         with conn.cursor() as cursor:
-            # Query to get basic table statistics
-            basic_stats_query = """
-            SELECT
-                schemaname AS db_name,
-                relname AS table_name,
-                n_live_tup AS row_count,
-                pg_size_pretty(pg_total_relation_size(relid)) AS total_size,
-                pg_size_pretty(pg_table_size(relid)) AS table_size,
-                pg_size_pretty(pg_indexes_size(relid)) AS index_size
-            FROM
-                pg_stat_user_tables
-            ORDER BY
-                n_live_tup DESC;
-            """
-            
-            cursor.execute(basic_stats_query)
-            basic_results = cursor.fetchall()
-            
-            for row in basic_results:
+            cursor.execute(TABLE_STATISTICS_QUERY.format(
+                table_filter=table_filter("WHERE relname::text = ANY({})", tables)))
+            for row in cursor.fetchall():
                 schema_name, table_name, row_count, total_size, table_size, index_size = row
                 statistics[table_name] = {
                     'row_count': row_count,
@@ -188,156 +240,593 @@ def extract_table_statistics(database, print_results=False):
                     'index_size': index_size,
                     'columns': {}
                 }
-                
-                # Query to get column statistics including distribution boundaries
-                column_stats_query = f"""
-                SELECT
-                    a.attname AS column_name,
-                    pg_stats.n_distinct,
-                    pg_stats.null_frac,
-                    pg_stats.avg_width,
-                    pg_stats.n_distinct,
-                    pg_stats.correlation,
-                    pg_stats.most_common_vals,
-                    pg_stats.most_common_freqs,
-                    pg_stats.histogram_bounds
-                FROM
-                    pg_stats
-                JOIN
-                    pg_attribute a ON pg_stats.attname = a.attname
-                WHERE
-                    pg_stats.schemaname = %s AND pg_stats.tablename = %s
-                    AND a.attnum > 0 AND NOT a.attisdropped
-                ORDER BY
-                    a.attnum;
-                """
-                
-                cursor.execute(column_stats_query, (schema_name, table_name,))
-                column_results = cursor.fetchall()
-                
-                for col_row in column_results:
-                    (col_name, n_distinct, null_frac, avg_width, n_distinct, 
-                     correlation, most_common_vals, most_common_freqs, histogram_bounds) = col_row
-                    
-                    statistics[table_name]['columns'][col_name] = {
-                        'n_distinct': n_distinct,
-                        'null_fraction': null_frac,
-                        'avg_width': avg_width,
-                        'correlation': correlation,
-                        'most_common_values': most_common_vals,
-                        # 'most_common_frequencies': most_common_freqs,
-                        'histogram_bounds': histogram_bounds
-                    }
-                
-                if print_results:
-                    print(f"Table: {table_name}")
-                    print(f"  Row Count: {row_count}")
-                    print(f"  Total Size: {total_size}")
-                    print(f"  Table Size: {table_size}")
-                    print(f"  Index Size: {index_size}")
-                    print("  Columns:")
-                    for col_name, col_stats in statistics[table_name]['columns'].items():
-                        print(f"    {col_name}:")
-                        print(f"      Distinct Values: {col_stats['n_distinct']}")
-                        print(f"      Null Fraction: {col_stats['null_fraction']}")
-                        print(f"      Average Width: {col_stats['avg_width']}")
-                        print(f"      Correlation: {col_stats['correlation']}")
-                        print(f"      Most Common Values: {col_stats['most_common_values']}")
-                        print(f"      Most Common Frequencies: {col_stats['most_common_frequencies']}")
-                        print(f"      Histogram Bounds: {col_stats['histogram_bounds']}")
-                    print("  ---")
-    
-    finally:
-        conn.close()
+
+            cursor.execute(COLUMN_STATISTICS_QUERY.format(
+                table_filter=table_filter("AND t.relname::text = ANY({})", tables)))
+            for col_row in cursor.fetchall():
+                (table_name, col_name, n_distinct, null_frac, avg_width,
+                 correlation, most_common_vals, most_common_freqs, histogram_bounds) = col_row
+                if table_name not in statistics:
+                    continue
+                statistics[table_name]['columns'][col_name] = {
+                    'n_distinct': n_distinct,
+                    'null_fraction': null_frac,
+                    'avg_width': avg_width,
+                    'correlation': correlation,
+                    'most_common_values': most_common_vals,
+                    # 'most_common_frequencies': most_common_freqs,
+                    'histogram_bounds': histogram_bounds
+                }
+
+    if print_results:
+        for table_name, table_stats in statistics.items():
+            print(f"Table: {table_name}")
+            print(f"  Row Count: {table_stats['row_count']}")
+            print(f"  Total Size: {table_stats['total_size']}")
+            print(f"  Table Size: {table_stats['table_size']}")
+            print(f"  Index Size: {table_stats['index_size']}")
+            print("  Columns:")
+            for col_name, col_stats in table_stats['columns'].items():
+                print(f"    {col_name}:")
+                print(f"      Distinct Values: {col_stats['n_distinct']}")
+                print(f"      Null Fraction: {col_stats['null_fraction']}")
+                print(f"      Average Width: {col_stats['avg_width']}")
+                print(f"      Correlation: {col_stats['correlation']}")
+                print(f"      Most Common Values: {col_stats['most_common_values']}")
+                print(f"      Histogram Bounds: {col_stats['histogram_bounds']}")
+            print("  ---")
     
     return statistics
 
 
 
-def scan_databases(filter_builtin_databases=True, print_results=False) -> dict:
+# One row per table of the public schema: a hash over everything that ends up in the catalog
+# (columns, types, nullability, defaults, comments and constraints) plus the pg_stat change counters.
+TABLE_FINGERPRINT_QUERY = """
+    SELECT
+        c.relname AS table_name,
+        md5(concat_ws('|',
+            (SELECT string_agg(concat_ws(':', a.attname, format_type(a.atttypid, a.atttypmod), a.attnotnull,
+                                         pg_get_expr(d.adbin, d.adrelid), col_description(c.oid, a.attnum)),
+                               ',' ORDER BY a.attnum)
+             FROM pg_attribute a
+             LEFT JOIN pg_attrdef d ON d.adrelid = a.attrelid AND d.adnum = a.attnum
+             WHERE a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped),
+            (SELECT string_agg(con.conname || ' ' || pg_get_constraintdef(con.oid), ',' ORDER BY con.conname)
+             FROM pg_constraint con
+             WHERE con.conrelid = c.oid),
+            obj_description(c.oid, 'pg_class')
+        )) AS schema_fingerprint,
+        concat_ws(':', s.n_tup_ins, s.n_tup_upd, s.n_tup_del) AS change_counters
+    FROM
+        pg_class c
+    JOIN
+        pg_namespace n ON n.oid = c.relnamespace
+    LEFT JOIN
+        pg_stat_user_tables s ON s.relid = c.oid
+    WHERE
+        n.nspname = 'public' AND c.relkind IN ('r', 'p', 'v', 'm', 'f');
+"""
+
+def extract_table_fingerprints(database) -> dict:
+    """
+    Extract a fingerprint for every table of the specified database with a single query.
+
+    Args:
+    database (str): The name of the database to fingerprint.
+
+    Returns:
+    dict: Table names mapped to {'fingerprint': <schema hash>, 'change_counters': <ins:upd:del>}.
+    """
+    with get_connection(database) as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(TABLE_FINGERPRINT_QUERY)
+            return {
+                table_name: {'fingerprint': fingerprint, 'change_counters': change_counters}
+                for table_name, fingerprint, change_counters in cursor.fetchall()
+            }
+
+def is_table_changed(previous_table_info, fingerprint, include_change_counters=False) -> bool:
+    """
+    Compare a freshly extracted table fingerprint with the one stored in the saved catalog.
+    """
+    if previous_table_info is None or previous_table_info.get('fingerprint') != fingerprint['fingerprint']:
+        return True
+    return include_change_counters and previous_table_info.get('change_counters') != fingerprint['change_counters']
+
+def merge_info(source, destination):
+    """
+    Recursively merge the source dictionary into the destination dictionary.
+    """
+    for key, value in source.items():
+        if isinstance(value, dict):
+            # get node or create one
+            node = destination.setdefault(key, {})
+            merge_info(value, node)
+        else:
+            destination[key] = value
+
+    return destination
+
+def scan_database(db_name, tables=None, fingerprints=None) -> dict:
+    """
+    Extracts schema and statistics for a single database, merging the information.
+
+    Args:
+    db_name (str): The name of the database to scan.
+    tables (list): Optional list of table names to restrict the scan to.
+    fingerprints (dict): Table fingerprints to record in the catalog; extracted when not provided.
+
+    Returns:
+    dict: A dictionary containing the database name and the combined table information.
+    """
+    db_info = {'name': db_name}
+
+    if fingerprints is None:
+        fingerprints = extract_table_fingerprints(database=db_name)
+    # Extract schema
+    schema = extract_schema(database=db_name, print_results=False, tables=tables)
+    # Extract statistics
+    statistics = extract_table_statistics(database=db_name, print_results=False, tables=tables)
+
+    # Merge schema and statistics
+    tables = {}
+    for table_name in schema.keys():
+        table_info = schema.get(table_name, {}).copy()
+        merge_info(statistics.get(table_name, {}), table_info)
+        merge_info(fingerprints.get(table_name, {}), table_info)
+        tables[table_name] = table_info
+
+    db_info['tables'] = tables
+    return db_info
+
+def refresh_database(db_name, previous_db_info, include_change_counters=False) -> tuple[dict, dict]:
+    """
+    Incrementally refresh a previously scanned database: only the tables whose fingerprint differs
+    from the saved catalog are extracted again, the others are carried over unchanged, including their
+    statistics unless row modifications count as changes. Changed tables coming back without columns
+    are dropped and reported as removed, so their embeddings are deleted.
+
+    Args:
+    db_name (str): The name of the database to refresh.
+    previous_db_info (dict): The saved catalog entry of the database.
+    include_change_counters (bool): Whether row modifications (pg_stat counters) also count as a change.
+
+    Returns:
+    tuple: The refreshed database information and a dictionary with the 'changed' and 'removed' table names.
+    """
+    previous_tables = previous_db_info.get('tables', {})
+    fingerprints = extract_table_fingerprints(database=db_name)
+    changed = [table_name for table_name, fingerprint in fingerprints.items()
+               if is_table_changed(previous_tables.get(table_name), fingerprint, include_change_counters)]
+    removed = [table_name for table_name in previous_tables if table_name not in fingerprints]
+
+    rescanned = scan_database(db_name, tables=changed, fingerprints=fingerprints)['tables'] if changed else {}
+    tables = {}
+    for table_name in fingerprints:
+        if table_name in rescanned:
+            tables[table_name] = rescanned[table_name]
+        elif table_name in previous_tables and table_name not in changed:
+            tables[table_name] = previous_tables[table_name]
+    removed.extend(table_name for table_name in changed if table_name not in tables and table_name in previous_tables)
+    changed = [table_name for table_name in changed if table_name in tables]
+
+    return {'name': db_name, 'tables': tables}, {'changed': changed, 'removed': removed}
+
+def run_per_database(task, databases, task_args=None, max_workers=None, executor=None) -> dict:
+    """
+    Run a per-database task for each database, sequentially or on a thread/process pool.
+    A failing database is logged and left out of the result, so it does not abort the others.
+
+    Args:
+    task (callable): Module level function called as task(db_name, *task_args[db_name]).
+    databases (list): The database names to process.
+    task_args (dict): Optional extra positional arguments per database.
+    max_workers (int): Number of databases processed in parallel. Defaults to the SCAN_WORKERS environment variable (1).
+    executor (str): "thread" or "process". Defaults to the SCAN_EXECUTOR environment variable ("thread").
+
+    Returns:
+    dict: The task results keyed by database name, in the order of the given databases.
+    """
+    max_workers = max_workers or int(os.getenv('SCAN_WORKERS', '1'))
+    executor = executor or os.getenv('SCAN_EXECUTOR', 'thread')
+    if executor not in ('thread', 'process'):
+        raise ValueError(f"Unknown scan executor: {executor}")
+    task_args = task_args or {}
+
+    results = {}
+    failed_databases = {}
+    total = len(databases)
+    started = time.monotonic()
+
+    def collect(db_name, get_result):
+        try:
+            results[db_name] = get_result()
+        except Exception as e:
+            failed_databases[db_name] = str(e)
+            logger.error(f"Failed to scan database {db_name}: {e}")
+            return
+        done = len(results) + len(failed_databases)
+        logger.info(f"Scanned database {db_name} [{done}/{total}] after {time.monotonic() - started:.1f}s")
+
+    if max_workers <= 1 or total <= 1:
+        for db_name in databases:
+            collect(db_name, lambda: task(db_name, *task_args.get(db_name, ())))
+    else:
+        pool_class = ProcessPoolExecutor if executor == 'process' else ThreadPoolExecutor
+        logger.info(f"Scanning {total} databases with {max_workers} {executor} workers")
+        with pool_class(max_workers=min(max_workers, total)) as pool:
+            futures = {pool.submit(task, db_name, *task_args.get(db_name, ())): db_name for db_name in databases}
+            for future in as_completed(futures):
+                collect(futures[future], future.result)
+
+    if failed_databases:
+        logger.warning(f"Scan finished with {len(failed_databases)} failed database(s): {', '.join(failed_databases)}")
+
+    # keep the catalog in the order reported by the server
+    return {db_name: results[db_name] for db_name in databases if db_name in results}
+
+def scan_databases(filter_builtin_databases=True, print_results=False, max_workers=None, executor=None) -> dict:
     """
     Extracts schema and statistics for all databases, merging the information.
-    Returns a dictionary containing the combined information for all databases.
-    """
-    def merge(source, destination):
-        for key, value in source.items():
-            if isinstance(value, dict):
-                # get node or create one
-                node = destination.setdefault(key, {})
-                merge(value, node)
-            else:
-                destination[key] = value
+    Databases are scanned concurrently when more than one worker is configured. A failing database
+    is logged and left out of the result, so it does not abort the scan of the remaining databases.
 
-        return destination
-    
-    all_database_info = {}
+    Args:
+    filter_builtin_databases (bool): Whether to skip the postgres and template databases.
+    print_results (bool): Whether to print the results to console.
+    max_workers (int): Number of databases scanned in parallel. Defaults to the SCAN_WORKERS environment variable (1).
+    executor (str): "thread" or "process". Defaults to the SCAN_EXECUTOR environment variable ("thread").
+
+    Returns:
+    dict: A dictionary containing the combined information for all databases.
+    """
     databases = extract_databases(filter_builtin_databases=filter_builtin_databases, print_results=False)
-    
-    for db_name in databases:
-        db_info = {'name': db_name}
-        
-        # Extract schema
-        schema = extract_schema(database=db_name, print_results=False)
-        # Extract statistics
-        statistics = extract_table_statistics(database=db_name, print_results=False)
-        
-        # Merge schema and statistics
-        tables = {}
-        for table_name in schema.keys():
-            table_info = schema.get(table_name, {}).copy()
-            merge(statistics.get(table_name, {}), table_info)
-            tables[table_name] = table_info
-        
-        db_info['tables'] = tables
-        all_database_info[db_name] = db_info
-    
+    all_database_info = run_per_database(scan_database, databases, max_workers=max_workers, executor=executor)
+
     if print_results:
         print(json.dumps(all_database_info, indent=2))
     
     return all_database_info
 
-def execute_sql_query(database: str, query: str) -> dict:
+def refresh_databases(previous_info, filter_builtin_databases=True, include_change_counters=False,
+                      max_workers=None, executor=None) -> tuple[dict, dict]:
+    """
+    Incrementally refresh the catalog of all databases against the previously saved catalog.
+    New databases are scanned fully, known ones only re-extract the tables whose fingerprint changed.
+    A database that fails to refresh keeps its previous catalog entry.
+
+    Args:
+    previous_info (dict): The previously saved catalog, keyed by database name.
+    filter_builtin_databases (bool): Whether to skip the postgres and template databases.
+    include_change_counters (bool): Whether row modifications (pg_stat counters) also count as a change.
+    max_workers (int): Number of databases refreshed in parallel.
+    executor (str): "thread" or "process".
+
+    Returns:
+    tuple: The refreshed catalog for all databases and the changes per database,
+    as {'<db>': {'changed': [...], 'removed': [...]}}. Only databases with changes are listed.
+    """
+    databases = extract_databases(filter_builtin_databases=filter_builtin_databases, print_results=False)
+    task_args = {db_name: (previous_info.get(db_name, {}), include_change_counters) for db_name in databases}
+    results = run_per_database(refresh_database, databases, task_args=task_args,
+                               max_workers=max_workers, executor=executor)
+
+    all_database_info = {}
+    changes = {}
+    for db_name in databases:
+        if db_name in results:
+            all_database_info[db_name], db_changes = results[db_name]
+            if db_changes['changed'] or db_changes['removed']:
+                changes[db_name] = db_changes
+        elif db_name in previous_info:
+            all_database_info[db_name] = previous_info[db_name]
+    for db_name, db_info in previous_info.items():
+        if db_name not in databases:
+            changes[db_name] = {'changed': [], 'removed': list(db_info.get('tables', {}))}
+
+    changed_tables = sum(len(db_changes['changed']) for db_changes in changes.values())
+    removed_tables = sum(len(db_changes['removed']) for db_changes in changes.values())
+    logger.info(f"Refreshed {len(all_database_info)} database(s): {changed_tables} changed and {removed_tables} removed table(s)")
+    return all_database_info, changes
+
+ROW_RETURNING_QUERY_PATTERN = re.compile(r"^\s*(?:(?:--[^\n]*\n|/\*.*?\*/)\s*)*(?:\(\s*)*(?:select|with|values|table)\b",
+                                         re.IGNORECASE | re.DOTALL)
+# keywords and functions turning a query starting like a read into a write: data-modifying CTEs, SELECT INTO,
+# row locks and sequence updates
+WRITING_SQL_PATTERN = re.compile(r"\b(?:insert|update|delete|merge|into|for\s+(?:no\s+key\s+)?(?:update|share)|nextval|setval)\b")
+
+def is_read_only_query(query: str) -> bool:
+    """
+    Check whether a query is a single plain read: one statement starting with SELECT, WITH, VALUES or TABLE
+    that modifies nothing. Only these run on a named cursor, can be cached and replayed, or raced.
+    """
+    if not ROW_RETURNING_QUERY_PATTERN.match(query):
+        return False
+    # literals, quoted identifiers and comments can't hide statement separators or keywords
+    code = SQL_TOKEN_PATTERN.sub(lambda match: f" {match.group('identifier').lower()} "
+                                 if match.group('identifier') is not None else " ", query)
+    statements = [statement for statement in code.split(";") if statement.strip()]
+    return len(statements) == 1 and not WRITING_SQL_PATTERN.search(code)
+
+def get_fetch_settings(batch_size=None, max_rows=None) -> tuple[int, int]:
+    """
+    Resolve the fetch batch size and row cap, falling back to the QUERY_FETCH_BATCH_SIZE
+    and QUERY_MAX_ROWS environment variables. A row cap of 0 means unlimited.
+    """
+    batch_size = batch_size or int(os.getenv('QUERY_FETCH_BATCH_SIZE', '1000'))
+    max_rows = max_rows if max_rows is not None else int(os.getenv('QUERY_MAX_ROWS', '10000'))
+    return batch_size, max_rows
+
+class SqlResultStream:
+    """
+    Incremental access to the result of a query executed by stream_sql_query.
+
+    Iterating yields rows, batches() yields lists of rows of at most batch_size. Once the stream
+    is consumed, truncated tells whether rows were left unread because of the row cap.
+    """
+
+    def __init__(self, cursor, batch_size, max_rows):
+        self._cursor = cursor
+        self.batch_size = batch_size
+        self.max_rows = max_rows
+        self.truncated = False
+        self.row_count = 0
+        # named cursors only describe their result after the first fetch
+        self._pending = cursor.fetchmany(batch_size) if cursor.name or cursor.description else None
+        self.columns = [desc[0] for desc in cursor.description] if cursor.description else None
+        self.rowcount = cursor.rowcount
+
+    def batches(self):
+        if self.columns is None:
+            return
+        batch, self._pending = self._pending, None
+        while batch:
+            if self.max_rows and self.row_count + len(batch) > self.max_rows:
+                batch = batch[:self.max_rows - self.row_count]
+                self.truncated = True
+            self.row_count += len(batch)
+            if batch:
+                yield batch
+            if self.truncated:
+                return
+            if self.max_rows and self.row_count == self.max_rows:
+                self.truncated = len(self._cursor.fetchmany(1)) > 0
+                return
+            batch = self._cursor.fetchmany(self.batch_size)
+
+    def __iter__(self):
+        for batch in self.batches():
+            yield from batch
+
+class QueryCancellation:
+    """
+    Cancels a group of queries, e.g. the candidates of a race once one of them succeeded. The queries of
+    the group running when cancel() is called are canceled on the server, later ones fail right away.
+    """
+
+    def __init__(self):
+        self.event = threading.Event()
+        self._lock = threading.Lock()
+        self._connections = set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self.event.is_set()
+
+    @contextmanager
+    def watch(self, conn):
+        with self._lock:
+            if self.event.is_set():
+                raise psycopg2.extensions.QueryCanceledError("canceling statement due to user request")
+            self._connections.add(conn)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._connections.discard(conn)
+
+    def cancel(self):
+        with self._lock:
+            self.event.set()
+            for conn in self._connections:
+                try:
+                    conn.cancel()
+                except psycopg2.Error as e:
+                    logger.debug(f"Failed to cancel a query: {e}")
+
+@contextmanager
+def stream_sql_query(database: str, query: str, batch_size=None, max_rows=None, statement_timeout=None,
+                     cancellation=None):
+    """
+    Executes a SQL query and streams its result. Row returning queries run on a server-side
+    (named) cursor, so only one batch of rows is held in memory at a time. They pass the cost
+    guard first, which may add a LIMIT or reject them based on their EXPLAIN estimates.
+    Other statements, including data-modifying CTEs, SELECT INTO and multi-statement strings,
+    run on a client-side cursor.
+
+    Args:
+    database (str): The name of the database to connect to.
+    query (str): The SQL query to execute.
+    batch_size (int): Number of rows fetched per round trip.
+    max_rows (int): Maximum number of rows to read; 0 means unlimited.
+    statement_timeout (int): Statement timeout in milliseconds. Defaults to QUERY_STATEMENT_TIMEOUT (60000).
+    cancellation (QueryCancellation): Optional group the query can be canceled with.
+
+    Yields:
+    SqlResultStream: The columns and the rows of the result. Statements other than plain reads
+    are committed when the block exits without an error.
+
+    Raises:
+    QueryRejectedError: If the cost guard rejects the query.
+    """
+    batch_size, max_rows = get_fetch_settings(batch_size, max_rows)
+    statement_timeout = get_statement_timeout(statement_timeout)
+    with get_connection(database) as conn, cancellation.watch(conn) if cancellation else nullcontext():
+        if statement_timeout:
+            with conn.cursor() as cursor:
+                cursor.execute("SET LOCAL statement_timeout = %s", (statement_timeout,))
+        read_only = is_read_only_query(query)
+        if read_only:
+            query = admit_query(conn, query, max_rows)
+            cursor = conn.cursor(name=f"cerebro_{uuid.uuid4().hex}")
+            cursor.itersize = batch_size
+        else:
+            cursor = conn.cursor()
+        try:
+            cursor.execute(query)
+            stream = SqlResultStream(cursor, batch_size, max_rows)
+            yield stream
+            if not read_only:
+                conn.commit()
+        finally:
+            cursor.close()
+
+def export_sql_query(database: str, query: str, file_path: str, batch_size=None, max_rows=0) -> dict:
+    """
+    Executes a SQL query and writes its result to a CSV file batch by batch.
+
+    Args:
+    database (str): The name of the database to connect to.
+    query (str): The SQL query to execute.
+    file_path (str): The path of the CSV file to write.
+    batch_size (int): Number of rows fetched per round trip.
+    max_rows (int): Maximum number of rows to export; 0 (default) means unlimited.
+
+    Returns:
+    dict: A dictionary containing the number of exported rows or an error message.
+    """
+    try:
+        with stream_sql_query(database, query, batch_size=batch_size, max_rows=max_rows) as stream:
+            if stream.columns is None:
+                return {"success": False, "error": "Query does not return rows"}
+            with open(file_path, 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(stream.columns)
+                for batch in stream.batches():
+                    writer.writerows(batch)
+            return {"success": True, "rows": stream.row_count, "truncated": stream.truncated}
+    except (psycopg2.Error, PoolError, QueryRejectedError) as e:
+        return {
+            "success": False,
+            "error": str(e)
+        }
+
+# change counters per relation name; views and foreign tables have none, relation names present in several
+# schemas get the counters of all of them
+RELATION_CHANGE_COUNTERS_QUERY = """
+    SELECT
+        c.relname AS relation_name,
+        CASE WHEN bool_and(s.relid IS NOT NULL)
+             THEN string_agg(concat_ws(':', s.n_tup_ins, s.n_tup_upd, s.n_tup_del), ',' ORDER BY n.nspname)
+        END AS change_counters
+    FROM
+        pg_class c
+    JOIN
+        pg_namespace n ON n.oid = c.relnamespace
+    LEFT JOIN
+        pg_stat_user_tables s ON s.relid = c.oid
+    WHERE
+        n.nspname NOT IN ('pg_catalog', 'information_schema') AND n.nspname NOT LIKE 'pg_toast%'
+        AND c.relkind IN ('r', 'p', 'v', 'm', 'f')
+    GROUP BY
+        c.relname;
+"""
+
+result_cache = None
+
+def get_result_cache():
+    """
+    Return the result cache of execute_sql_query, creating it on first use. Returns None if it is disabled
+    (RESULT_CACHE=0). RESULT_CACHE_TTL, RESULT_CACHE_MAX_ENTRIES, RESULT_CACHE_MAX_ROWS and
+    RESULT_CACHE_STATS_INTERVAL configure it.
+    """
+    global result_cache
+    if result_cache is None and os.getenv('RESULT_CACHE', '1') != '0':
+        result_cache = ResultCache(ttl=float(os.getenv('RESULT_CACHE_TTL', '300')),
+                                   max_entries=int(os.getenv('RESULT_CACHE_MAX_ENTRIES', '256')),
+                                   max_rows=int(os.getenv('RESULT_CACHE_MAX_ROWS', '100000')),
+                                   stats_interval=float(os.getenv('RESULT_CACHE_STATS_INTERVAL', '5')))
+    return result_cache
+
+def extract_change_counters(database) -> dict:
+    """
+    Extract the ins:upd:del counters of pg_stat_user_tables for every relation of the specified database,
+    None for relations without statistics (views, foreign tables).
+    """
+    with get_connection(database) as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(RELATION_CHANGE_COUNTERS_QUERY)
+            return dict(cursor.fetchall())
+
+def execute_sql_query(database: str, query: str, max_rows=None, batch_size=None, cancellation=None) -> dict:
     """
     Executes a SQL query on the specified database and returns the result or the execution error.
+    The returned rows are capped at max_rows; 'truncated' tells whether the result had more rows.
+    Results of read-only queries are served from the result cache while the tables they read are unmodified;
+    any other statement drops the cached results of the database once it is committed.
 
     Args:
     database (str): The name of the database to connect to.
     query (str): The SQL query to execute.
+    max_rows (int): Maximum number of rows to return. Defaults to the QUERY_MAX_ROWS environment variable (10000).
+    batch_size (int): Number of rows fetched per round trip. Defaults to QUERY_FETCH_BATCH_SIZE (1000).
+    cancellation (QueryCancellation): Optional group the query can be canceled with.
 
     Returns:
     dict: A dictionary containing either the query result or an error message.
     """
+    read_only = is_read_only_query(query)
+    cache = get_result_cache() if read_only and is_cacheable(query) else None
+    if cache:
+        cache_key = (database, normalize_sql(query), get_fetch_settings(max_rows=max_rows)[1])
+        try:
+            cached = cache.get(cache_key, database, extract_change_counters)
+            telemetry.record_cache("result", int(cached is not None), int(cached is None))
+            if cached is not None:
+                logger.debug(f"Serving cached result for query on {database}")
+                return dict(cached, data=list(cached['data']))
+            # read before the query runs, so modifications made meanwhile invalidate the entry
+            counters = cache.counters(database, extract_change_counters)
+        except (psycopg2.Error, PoolError) as e:
+            logger.warning(f"Result cache unavailable for {database}: {e}")
+            cache = None
+
     try:
-        conn_params = get_db_connection_params()
-        conn_params['dbname'] = database
-        
-        conn = psycopg2.connect(**conn_params)
-        
-        with conn.cursor() as cur:
-            cur.execute(query)
-            
-            if cur.description:
-                columns = [desc[0] for desc in cur.description]
-                results = cur.fetchall()
-                return {
+        with stream_sql_query(database, query, batch_size=batch_size, max_rows=max_rows,
+                              cancellation=cancellation) as stream:
+            if stream.columns is not None:
+                results = list(stream)
+                result = {
                     "success": True,
-                    "columns": columns,
-                    "data": results
+                    "columns": stream.columns,
+                    "data": results,
+                    "truncated": stream.truncated
                 }
+                if cache:
+                    cache.put(cache_key, database, query, dict(result, data=list(results)), counters)
             else:
-                conn.commit()
-                return {
+                result = {
                     "success": True,
-                    "message": f"Query executed successfully. Rows affected: {cur.rowcount}"
+                    "message": f"Query executed successfully. Rows affected: {stream.rowcount}"
                 }
+        if not read_only and get_result_cache():
+            # the statement was committed when the stream closed
+            get_result_cache().invalidate(database)
+        return result
     
-    except psycopg2.Error as e:
+    except psycopg2.extensions.QueryCanceledError as e:
+        if cancellation and cancellation.cancelled:
+            return {
+                "success": False,
+                "error": str(e).strip()
+            }
+        return {
+            "success": False,
+            "error": f"{str(e).strip()}. The query ran longer than the statement timeout, write a cheaper query."
+        }
+    except (psycopg2.Error, PoolError, QueryRejectedError) as e:
         return {
             "success": False,
             "error": str(e)
         }
-    
-    finally:
-        if conn:
-            conn.close()
-
@@ -0,0 +1,188 @@
+import os
+import time
+import atexit
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+import psycopg2
+from psycopg2 import extensions
+from psycopg2.pool import PoolError
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+def get_pool_settings() -> dict:
+    """
+    Retrieve connection pool settings from environment variables.
+    """
+    return {
+        'max_size': int(os.getenv('DB_POOL_SIZE', '5')),
+        'idle_timeout': float(os.getenv('DB_POOL_IDLE_TIMEOUT', '300')),
+        'health_check_interval': float(os.getenv('DB_POOL_HEALTH_CHECK_INTERVAL', '30')),
+        'acquire_timeout': float(os.getenv('DB_POOL_ACQUIRE_TIMEOUT', '30')),
+    }
+
+class ConnectionPool:
+    """
+    A thread-safe pool of connections to a single database.
+
+    Idle connections are reused most-recently-used first, evicted once they have been idle longer
+    than idle_timeout, and checked with a round trip before reuse once they have been idle longer
+    than health_check_interval. Broken connections are discarded instead of being returned to the pool.
+    """
+
+    def __init__(self, conn_params, max_size=5, idle_timeout=300.0, health_check_interval=30.0, acquire_timeout=30.0):
+        self.conn_params = conn_params
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self.acquire_timeout = acquire_timeout
+        self._idle = deque()  # (connection, returned_at), most recently returned on the right
+        self._in_use = 0
+        self._closed = False
+        self._condition = threading.Condition()
+
+    def _evict_idle(self, now):
+        while self._idle and now - self._idle[0][1] > self.idle_timeout:
+            conn, _ = self._idle.popleft()
+            logger.debug(f"Evicting idle connection to {self.conn_params['dbname']}")
+            self._close_quietly(conn)
+
+    def _is_healthy(self, conn, idle_for) -> bool:
+        if conn.closed:
+            return False
+        if idle_for < self.health_check_interval:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    def getconn(self):
+        """
+        Take a connection from the pool, opening a new one if the pool is not at its maximum size.
+        Blocks up to acquire_timeout seconds when all connections are in use.
+        """
+        deadline = time.monotonic() + self.acquire_timeout
+        with self._condition:
+            while True:
+                if self._closed:
+                    raise PoolError("connection pool is closed")
+                now = time.monotonic()
+                self._evict_idle(now)
+                if self._idle:
+                    conn, returned_at = self._idle.pop()
+                    self._in_use += 1
+                    break
+                if self._in_use < self.max_size:
+                    conn, returned_at = None, None
+                    self._in_use += 1
+                    break
+                remaining = deadline - now
+                if remaining <= 0:
+                    raise PoolError(f"timed out waiting for a connection to {self.conn_params['dbname']}")
+                self._condition.wait(remaining)
+
+        # connecting and health checks happen outside of the lock
+        try:
+            if conn is not None and not self._is_healthy(conn, time.monotonic() - returned_at):
+                logger.debug(f"Discarding broken connection to {self.conn_params['dbname']}")
+                self._close_quietly(conn)
+                conn = None
+            if conn is None:
+                conn = psycopg2.connect(**self.conn_params)
+            return conn
+        except Exception:
+            with self._condition:
+                self._in_use -= 1
+                self._condition.notify()
+            raise
+
+    def putconn(self, conn, discard=False):
+        """
+        Return a connection to the pool. Any open transaction is rolled back first.
+        """
+        if not discard and not conn.closed:
+            try:
+                if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                discard = True
+        with self._condition:
+            self._in_use -= 1
+            if discard or conn.closed or self._closed:
+                self._close_quietly(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._condition.notify()
+
+    @contextmanager
+    def connection(self):
+        """
+        Borrow a connection for the duration of a with block.
+        """
+        conn = self.getconn()
+        discard = False
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+            # a statement canceled by its timeout leaves the connection usable
+            discard = not isinstance(e, extensions.QueryCanceledError)
+            raise
+        finally:
+            self.putconn(conn, discard=discard)
+
+    def close(self):
+        """
+        Close all idle connections; connections in use are closed when they are returned.
+        """
+        with self._condition:
+            self._closed = True
+            while self._idle:
+                conn, _ = self._idle.popleft()
+                self._close_quietly(conn)
+            self._condition.notify_all()
+
+_pools = {}
+_pools_pid = os.getpid()
+_pools_lock = threading.Lock()
+
+def get_pool(conn_params) -> ConnectionPool:
+    """
+    Return the shared pool for the given connection parameters, creating it on first use.
+    """
+    global _pools, _pools_pid
+    key = tuple(sorted(conn_params.items()))
+    with _pools_lock:
+        if _pools_pid != os.getpid():
+            # connections inherited from the parent process must not be shared with it
+            _pools, _pools_pid = {}, os.getpid()
+        pool = _pools.get(key)
+        if pool is None:
+            pool = ConnectionPool(dict(conn_params), **get_pool_settings())
+            _pools[key] = pool
+        return pool
+
+def close_all_pools():
+    """
+    Close the idle connections of every pool when terminating the application.
+    """
+    with _pools_lock:
+        if _pools_pid != os.getpid():
+            return
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
+
+atexit.register(close_all_pools)
@@ -0,0 +1,151 @@
+import re
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# string literals (also dollar quoted), quoted identifiers, runs of whitespace and comments and identifiers of a statement
+SQL_TOKEN_PATTERN = re.compile(r"""(?P<literal>'(?:[^']|'')*'|\$(?P<tag>[A-Za-z_]*)\$.*?\$(?P=tag)\$)"""
+                               r"""|(?P<quoted>"(?:[^"]|"")*")|(?P<whitespace>(?:\s+|--[^\n]*|/\*.*?\*/)+)"""
+                               r"""|(?P<identifier>[A-Za-z_][A-Za-z0-9_$]*)""",
+                               re.DOTALL)
+# results of statements calling these functions change without any table being modified
+VOLATILE_SQL_PATTERN = re.compile(r"\b(?:now|random|clock_timestamp|statement_timestamp|timeofday|nextval|setval|"
+                                  r"current_date|current_time|current_timestamp|localtime|localtimestamp|"
+                                  r"txid_current|pg_sleep|gen_random_uuid|uuid_generate_v\d\w*)\b"
+                                  r"|\b(?:insert|update|delete|merge|for\s+update|for\s+share)\b",
+                                  re.IGNORECASE)
+
+def normalize_sql(query: str) -> str:
+    """
+    Normalize a statement for use as cache key: comments are removed, whitespace is collapsed, keywords and
+    unquoted identifiers are lowercased and trailing semicolons are dropped. Literals are left untouched.
+    """
+    def normalize_token(match):
+        if match.group('whitespace') is not None:
+            return " "
+        if match.group('identifier') is not None:
+            return match.group('identifier').lower()
+        return match.group(0)
+    return SQL_TOKEN_PATTERN.sub(normalize_token, query).strip().rstrip(";").strip()
+
+def referenced_relations(query: str) -> set[str]:
+    """
+    Names of the relations a statement may read: every unquoted identifier (lowercased) and quoted identifier.
+    This over-approximates the referenced tables, which only makes the invalidation more eager.
+    """
+    names = set()
+    for match in SQL_TOKEN_PATTERN.finditer(query):
+        if match.group('identifier') is not None:
+            names.add(match.group('identifier').lower())
+        elif match.group('quoted') is not None:
+            names.add(match.group('quoted')[1:-1].replace('""', '"'))
+    return names
+
+def is_cacheable(query: str) -> bool:
+    return not VOLATILE_SQL_PATTERN.search(query)
+
+class ResultCache:
+    """
+    In-memory cache of query results, invalidated by the modification counters of the tables a query reads.
+
+    Each entry records the ins:upd:del counters of pg_stat_user_tables of the tables referenced by its
+    query; it is only served while these counters are unchanged and it is younger than ttl seconds. The
+    counters of a database are read with a single query and reused for stats_interval seconds, so repeated
+    queries within that interval are answered without contacting Postgres. As Postgres reports table
+    statistics with a short delay, the ttl bounds how long a result can miss a modification; writes made
+    through the cache's own process drop the entries of their database right away (see invalidate).
+    Above max_entries entries or max_rows cached rows, the least recently used entries are evicted.
+    """
+
+    def __init__(self, ttl=300.0, max_entries=256, max_rows=100000, stats_interval=5.0):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_rows = max_rows
+        self.stats_interval = stats_interval
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._rows = 0
+        self._counters = {}
+
+    def counters(self, database, fetch_counters) -> dict:
+        """
+        Return the change counters of the relations of a database, fetching them if the last snapshot is too old.
+        """
+        with self._lock:
+            snapshot = self._counters.get(database)
+        if snapshot is not None and time.monotonic() - snapshot[0] < self.stats_interval:
+            return snapshot[1]
+        counters = fetch_counters(database)
+        with self._lock:
+            self._counters[database] = (time.monotonic(), counters)
+        return counters
+
+    def get(self, key, database, fetch_counters):
+        """
+        Return the cached result of a statement, or None if it's not cached, expired or one of its tables changed.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires, _, table_counters, result = entry
+        if time.monotonic() >= expires:
+            self.discard(key)
+            return None
+        counters = self.counters(database, fetch_counters)
+        if any(counters.get(table) != table_counter for table, table_counter in table_counters.items()):
+            logger.debug(f"Cached result invalidated by modifications of {', '.join(table_counters)}")
+            self.discard(key)
+            return None
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+        return result
+
+    def put(self, key, database, query, result, counters) -> bool:
+        """
+        Cache the result of a statement with the counters of the tables it references, as read before it ran.
+        Statements referencing no table, or a relation without counters (e.g. a view), are not cached.
+        """
+        references = referenced_relations(query) & counters.keys()
+        if not references or any(counters[table] is None for table in references):
+            return False
+        rows = len(result.get('data', []))
+        if rows > self.max_rows:
+            return False
+        with self._lock:
+            self._pop(key)
+            self._entries[key] = (time.monotonic() + self.ttl, database,
+                                  {table: counters[table] for table in references}, result)
+            self._rows += rows
+            while len(self._entries) > self.max_entries or self._rows > self.max_rows:
+                self._pop(next(iter(self._entries)))
+        return True
+
+    def _pop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._rows -= len(entry[3].get('data', []))
+
+    def discard(self, key):
+        with self._lock:
+            self._pop(key)
+
+    def invalidate(self, database):
+        """
+        Drop the entries and the counter snapshot of a database after a statement modified it. Postgres reports
+        the modification in the counters with a delay, so the entries would otherwise still be served.
+        """
+        with self._lock:
+            for key in [key for key, entry in self._entries.items() if entry[1] == database]:
+                self._pop(key)
+            self._counters.pop(database, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._counters.clear()
+            self._rows = 0
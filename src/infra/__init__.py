@@ -1,4 +1,5 @@
 from src.infra.qdrant import search_schema_embeddings
+from src.infra.vector_store import SearchResult
 from src.utils import create_schema_text, table_info_to_ddl
 
 def fetch_relevant_tables_schema_text(user_question) -> str:
@@ -10,11 +11,47 @@ def fetch_relevant_tables_schema_text(user_question) -> str:
         relevant_tables.append(text)
     return "\n---\n".join(relevant_tables)
 
-def fetch_relevant_tables_ddl(user_question) -> str:
-    search_result = search_schema_embeddings(user_question)
+def tables_ddl(search_result) -> str:
     relevant_tables = list()
     for result in search_result:
         # result.score
         table_ddl = table_info_to_ddl(result.payload['database'], result.payload['table'], result.payload['schema'] )
         relevant_tables.append(table_ddl)
-    return "\n".join(relevant_tables)
\ No newline at end of file
+    return "\n".join(relevant_tables)
+
+def table_keys(search_result) -> list[str]:
+    return [f"{result.payload['database']}.{result.payload['table']}" for result in search_result]
+
+def merge_column_hits(first, second) -> SearchResult:
+    """
+    Combine two column index hits of the same table: the score and columns of the better hit,
+    followed by the columns only the other hit matched.
+    """
+    better, other = (first, second) if first.score >= second.score else (second, first)
+    columns = dict(better.payload['schema']['columns'])
+    for column, column_info in other.payload['schema']['columns'].items():
+        columns.setdefault(column, column_info)
+    payload = dict(better.payload,
+                   columns=list(dict.fromkeys(better.payload['columns'] + other.payload['columns'])),
+                   schema=dict(better.payload['schema'], columns=columns))
+    return SearchResult(id=better.id, score=better.score, payload=payload)
+
+def merge_search_results(*search_results, limit=None) -> list:
+    """
+    Merge the results of several schema searches: one hit per table with its best score, best first.
+    Hits of the column index (SCHEMA_INDEX_MODE=column) keep the union of the columns matched by each search.
+    The merged list is cut to the length of the longest input unless a limit is given.
+    """
+    best = {}
+    for search_result in search_results:
+        for result in search_result:
+            key = (result.payload['database'], result.payload['table'])
+            if key in best and 'columns' in result.payload:
+                best[key] = merge_column_hits(best[key], result)
+            elif key not in best or result.score > best[key].score:
+                best[key] = result
+    limit = limit or max((len(search_result) for search_result in search_results), default=0)
+    return sorted(best.values(), key=lambda result: result.score, reverse=True)[:limit]
+
+def fetch_relevant_tables_ddl(user_question) -> str:
+    return tables_ddl(search_schema_embeddings(user_question))
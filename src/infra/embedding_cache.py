@@ -0,0 +1,89 @@
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+def content_hash(text: str) -> str:
+    """
+    Hash of the text an embedding was computed from.
+    """
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+class EmbeddingCache:
+    """
+    Persistent, content-addressed embedding cache backed by SQLite.
+
+    Entries are keyed by model name and the SHA-256 of the embedded text, so the same text
+    embedded by different models is cached side by side. Once the cache holds more than
+    max_entries embeddings, the least recently used ones are evicted.
+    """
+
+    def __init__(self, path, max_entries=100000):
+        self.path = path
+        self.max_entries = max_entries
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (model, text_hash)
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self._conn.commit()
+
+    def get_many(self, model_name, texts) -> list:
+        """
+        Look up the embeddings of the given texts.
+
+        :param model_name: Name of the embedding model
+        :param texts: List of texts
+        :return: A list aligned with texts holding a float32 vector or None for each cache miss
+        """
+        hashes = [content_hash(text) for text in texts]
+        found = {}
+        with self._lock:
+            # stay well below SQLite's bound parameter limit
+            for start in range(0, len(hashes), 500):
+                chunk = hashes[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({placeholders})",
+                    [model_name, *chunk]).fetchall()
+                found.update((text_hash, np.frombuffer(vector, dtype=np.float32)) for text_hash, vector in rows)
+            if found:
+                now = time.time()
+                self._conn.executemany("UPDATE embeddings SET last_used = ? WHERE model = ? AND text_hash = ?",
+                                       [(now, model_name, text_hash) for text_hash in found])
+                self._conn.commit()
+        return [found.get(text_hash) for text_hash in hashes]
+
+    def put_many(self, model_name, texts, vectors):
+        """
+        Store the embeddings of the given texts and evict the least recently used entries above the size limit.
+        """
+        now = time.time()
+        rows = [(model_name, content_hash(text), np.asarray(vector, dtype=np.float32).tobytes(), now)
+                for text, vector in zip(texts, vectors)]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings (model, text_hash, vector, last_used) VALUES (?, ?, ?, ?)", rows)
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+            if count > self.max_entries:
+                self._conn.execute("DELETE FROM embeddings WHERE rowid IN "
+                                   "(SELECT rowid FROM embeddings ORDER BY last_used LIMIT ?)", (count - self.max_entries,))
+                logger.debug(f"Evicted {count - self.max_entries} embedding(s) from {self.path}")
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,80 @@
+import os
+import asyncio
+import logging
+import threading
+import functools
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+session = None
+executor = None
+_init_lock = threading.Lock()
+
+def get_ollama_url() -> str:
+    return os.getenv("OLLAMA_URL", "http://localhost:11434").rstrip("/")
+
+def get_timeout() -> tuple[float, float]:
+    """
+    Connect and read timeouts of Ollama calls; for streamed responses the read timeout applies per chunk.
+    """
+    return float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "5")), float(os.getenv("OLLAMA_READ_TIMEOUT", "300"))
+
+def get_session() -> requests.Session:
+    """
+    Return the HTTP session shared by all Ollama calls, creating it on first use.
+    It keeps up to OLLAMA_POOL_SIZE keep-alive connections and retries failed connections
+    OLLAMA_RETRIES times with exponential backoff (OLLAMA_RETRY_BACKOFF). Read errors and 429/5xx
+    responses are only retried for GET: a POST /api/generate failing after it was sent may have
+    been generating for minutes, and retrying it would run the generation again from scratch.
+    """
+    global session
+    if session is None:
+        with _init_lock:
+            if session is None:
+                retry = Retry(
+                    total=int(os.getenv("OLLAMA_RETRIES", "3")),
+                    backoff_factor=float(os.getenv("OLLAMA_RETRY_BACKOFF", "0.5")),
+                    status_forcelist=(429, 500, 502, 503, 504),
+                    # connect errors are retried for every method, read errors and statuses only for these
+                    allowed_methods=frozenset(["GET"]),
+                    raise_on_status=False
+                )
+                pool_size = int(os.getenv("OLLAMA_POOL_SIZE", "8"))
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+                new_session = requests.Session()
+                new_session.mount("http://", adapter)
+                new_session.mount("https://", adapter)
+                session = new_session
+    return session
+
+def post(path, payload, stream=False) -> requests.Response:
+    """
+    POST a JSON payload to the Ollama API over the shared session.
+
+    :param path: API path, e.g. "/api/generate"
+    :param payload: JSON payload
+    :param stream: Whether to stream the response body
+    :return: The response; use it as a context manager when streaming
+    """
+    return get_session().post(f"{get_ollama_url()}{path}", json=payload, stream=stream, timeout=get_timeout())
+
+def get_executor() -> ThreadPoolExecutor:
+    global executor
+    if executor is None:
+        with _init_lock:
+            if executor is None:
+                executor = ThreadPoolExecutor(max_workers=int(os.getenv("OLLAMA_POOL_SIZE", "8")),
+                                              thread_name_prefix="ollama")
+    return executor
+
+async def run_async(func, *args, **kwargs):
+    """
+    Run a blocking Ollama call on the client's worker threads, so concurrent calls from an event loop
+    proceed in parallel over the pooled connections without blocking the loop.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), functools.partial(func, *args, **kwargs))
@@ -1,21 +1,41 @@
 import os
+import time
 import uuid
 import atexit
 import logging
+import threading
+import numpy as np
 from qdrant_client import QdrantClient
 from qdrant_client.http import models
-from sentence_transformers import SentenceTransformer
+import src
+from src import telemetry
 from src.utils import table_info_to_ddl
+from src.infra.embedding_cache import EmbeddingCache
+from src.infra.semantic_cache import SemanticCache
+from src.infra.vector_store import VectorStore, LocalVectorStore, SearchResult
+from src.catalog import load_compiled_catalog
+from src.lexical_index import search_lexical, reciprocal_rank_fusion, tokenize, query_terms
 # from src.llmops import generate_embedding_with_ollama
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-# Initialize the SentenceTransformer model
-model = SentenceTransformer('all-MiniLM-L6-v2')
-# model = SentenceTransformer('s2593817/sft-sql-embedding')   
-# model = SentenceTransformer('RaduGabriel/BGE-M3-SQL')
+# The SentenceTransformer model and the Qdrant client are initialized on first use (see get_model and get_client),
+# so importing this module neither loads the model nor requires a running Qdrant.
+# The model is selected by EMBEDDING_MODEL, read on use so it can be set in the .env file loaded after the imports:
+# EMBEDDING_MODEL=s2593817/sft-sql-embedding
+# EMBEDDING_MODEL=RaduGabriel/BGE-M3-SQL
+DEFAULT_EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+collection_name = "schema_embeddings"
+# one point per column, indexed instead of the table points when SCHEMA_INDEX_MODE=column
+column_collection_name = "schema_column_embeddings"
+model = None
+client = None
+embedding_cache = None
+semantic_cache = None
+vector_stores = {}
+_init_lock = threading.Lock()
 
 
 def initialize_qdrant():
@@ -37,6 +57,89 @@ def initialize_qdrant():
     
     return client, collection_name
 
+def get_embedding_model_name() -> str:
+    return os.getenv("EMBEDDING_MODEL", DEFAULT_EMBEDDING_MODEL)
+
+def get_model():
+    """
+    Return the SentenceTransformer model, loading it on first use.
+    """
+    global model
+    if model is None:
+        with _init_lock:
+            if model is None:
+                started = time.perf_counter()
+                # imported here, importing sentence_transformers (and torch) alone takes seconds
+                from sentence_transformers import SentenceTransformer
+                model_name = get_embedding_model_name()
+                model = SentenceTransformer(model_name)
+                logger.info(f"Loaded embedding model {model_name} in {time.perf_counter() - started:.2f}s")
+    return model
+
+def get_client():
+    """
+    Return the Qdrant client, connecting and creating the collection on first use.
+    """
+    global client
+    if client is None:
+        with _init_lock:
+            if client is None:
+                started = time.perf_counter()
+                client, _ = initialize_qdrant()
+                logger.info(f"Connected to Qdrant in {time.perf_counter() - started:.2f}s")
+    return client
+
+def get_embedding_cache():
+    """
+    Return the persistent embedding cache, opening it on first use. Returns None if it is disabled (EMBEDDING_CACHE=0).
+    """
+    global embedding_cache
+    if embedding_cache is None and os.getenv("EMBEDDING_CACHE", "1") != "0":
+        with _init_lock:
+            if embedding_cache is None:
+                cache_path = os.getenv("EMBEDDING_CACHE_PATH", os.path.join(src.PROJECT_FOLDER, "data", "embedding_cache.sqlite"))
+                embedding_cache = EmbeddingCache(cache_path, max_entries=int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "100000")))
+    return embedding_cache
+
+def get_semantic_cache():
+    """
+    Return the semantic question-to-SQL cache, opening it on first use. Returns None if it is disabled (SEMANTIC_CACHE=0).
+    """
+    global semantic_cache
+    if semantic_cache is None and os.getenv("SEMANTIC_CACHE", "1") != "0":
+        with _init_lock:
+            if semantic_cache is None:
+                cache_path = os.getenv("SEMANTIC_CACHE_PATH", os.path.join(src.PROJECT_FOLDER, "data", "semantic_cache.sqlite"))
+                semantic_cache = SemanticCache(cache_path,
+                                               threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95")),
+                                               max_entries=int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "10000")))
+    return semantic_cache
+
+def encode_texts(texts, batch_size=None) -> np.ndarray:
+    """
+    Embed the given texts, reusing cached embeddings of identical texts and only encoding the misses.
+
+    :param texts: List of texts to embed
+    :param batch_size: Encoder batch size, defaults to EMBEDDING_BATCH_SIZE
+    :return: A float32 array with one embedding per text
+    """
+    batch_size = batch_size or int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+    cache = get_embedding_cache()
+    model_name = get_embedding_model_name()
+    cached = cache.get_many(model_name, texts) if cache else [None] * len(texts)
+    missing = [i for i, vector in enumerate(cached) if vector is None]
+    if cache:
+        telemetry.record_cache("embedding", len(texts) - len(missing), len(missing))
+    if missing:
+        missing_texts = [texts[i] for i in missing]
+        encoded = get_model().encode(missing_texts, batch_size=batch_size, show_progress_bar=False)
+        if cache:
+            cache.put_many(model_name, missing_texts, encoded)
+        for i, vector in zip(missing, encoded):
+            cached[i] = vector
+    logger.debug(f"Embedded {len(texts)} text(s), {len(texts) - len(missing)} from cache")
+    return np.asarray(cached, dtype=np.float32)
+
 def cleanup_qdrant():
     """
     Gracefully release resources and close the connection to Qdrant when terminating the application.
@@ -53,88 +156,347 @@ def cleanup_qdrant():
             # Set the client to None to ensure it's not used after closing
             client = None
 
-client, collection_name = initialize_qdrant()
 atexit.register(cleanup_qdrant)
 
-def search_schema_embeddings(user_query, limit=5):
-    query_embedding = model.encode(user_query)
-    # query_embedding = generate_embedding_with_ollama(user_query)
-    search_result = client.search(
-        collection_name=collection_name,
-        query_vector=query_embedding.tolist(),
-        limit=limit  # Adjust this number based on how many results you want
+def to_qdrant_filter(payload_filter: dict) -> models.Filter:
+    """
+    Convert a payload filter of key -> value (a list value matches any of its items) to a Qdrant filter.
+    """
+    return models.Filter(
+        must=[
+            models.FieldCondition(
+                key=key,
+                match=models.MatchAny(any=list(value)) if isinstance(value, (list, tuple, set)) else models.MatchValue(value=value)
+            ) for key, value in payload_filter.items()
+        ]
     )
-    return search_result
 
-def retrieve_index_ids_by_payload(payload_filter: dict, limit: int = 100):
+class QdrantVectorStore(VectorStore):
     """
-    Retrieve index IDs from Qdrant based on payload values.
-
-    :param payload_filter: A dictionary specifying the payload filter conditions
-    :param limit: Maximum number of results to return (default: 100)
-    :return: A list of index IDs matching the payload filter
+    Vector store backed by a Qdrant collection.
     """
-    try:
-        # Construct the filter based on the provided payload conditions
-        filter_conditions = models.Filter(
-            must=[
-                models.FieldCondition(
-                    key=key,
-                    match=models.MatchValue(value=value)
-                ) for key, value in payload_filter.items()
-            ]
+
+    def __init__(self, client, name, vector_size):
+        self.client = client
+        self.name = name
+        collections = client.get_collections().collections
+        if not any(collection.name == name for collection in collections):
+            client.create_collection(
+                collection_name=name,
+                vectors_config=models.VectorParams(size=vector_size, distance=models.Distance.COSINE)
+            )
+
+    def upsert(self, ids, vectors, payloads):
+        self.client.upload_points(
+            collection_name=self.name,
+            points=[
+                models.PointStruct(id=point_id, vector=np.asarray(vector).tolist(), payload=payload)
+                for point_id, vector, payload in zip(ids, vectors, payloads)
+            ],
+            batch_size=int(os.getenv("QDRANT_UPSERT_BATCH_SIZE", "256")),
+            parallel=int(os.getenv("QDRANT_UPSERT_PARALLEL", "1")),
+            wait=True
         )
 
-        # Perform the search using the constructed filter
-        search_result = client.scroll(
-            collection_name=collection_name,
-            scroll_filter=filter_conditions,
+    def search(self, vector, limit=5, payload_filter=None) -> list:
+        return self.client.search(
+            collection_name=self.name,
+            query_vector=np.asarray(vector).tolist(),
+            query_filter=to_qdrant_filter(payload_filter) if payload_filter else None,
+            limit=limit
+        )
+
+    def retrieve(self, ids) -> list[SearchResult]:
+        records = self.client.retrieve(collection_name=self.name, ids=list(ids), with_payload=True, with_vectors=False)
+        return [SearchResult(id=str(record.id), score=1.0, payload=record.payload) for record in records]
+
+    def find_ids(self, payload_filter, limit=100) -> list[str]:
+        points, _ = self.client.scroll(
+            collection_name=self.name,
+            scroll_filter=to_qdrant_filter(payload_filter),
             limit=limit,
             with_payload=False,
             with_vectors=False
         )
+        return [point.id for point in points]
+
+    def delete(self, payload_filter, keep_ids=None, keep_filter=None):
+        qdrant_filter = to_qdrant_filter(payload_filter)
+        must_not = []
+        if keep_ids:
+            must_not.append(models.HasIdCondition(has_id=list(keep_ids)))
+        if keep_filter:
+            must_not.append(to_qdrant_filter(keep_filter))
+        if must_not:
+            qdrant_filter.must_not = must_not
+        self.client.delete(collection_name=self.name, points_selector=models.FilterSelector(filter=qdrant_filter))
+
+def get_vector_store(name=collection_name) -> VectorStore:
+    """
+    Return the vector store holding the named collection, creating it on first use.
+    The backend is selected by the VECTOR_STORE environment variable: "qdrant" (default) or "local",
+    an in-process store persisted under LOCAL_VECTOR_STORE_PATH (data/vectors).
+    """
+    store = vector_stores.get(name)
+    if store is None:
+        backend = os.getenv("VECTOR_STORE", "qdrant")
+        if backend == "local":
+            folder = os.getenv("LOCAL_VECTOR_STORE_PATH", os.path.join(src.PROJECT_FOLDER, "data", "vectors"))
+            store = LocalVectorStore(folder, name)
+        elif backend == "qdrant":
+            store = QdrantVectorStore(get_client(), name, int(os.getenv("EMBEDDING_DIMENSION", "384")))
+        else:
+            raise ValueError(f"Unknown vector store backend: {backend}")
+        with _init_lock:
+            store = vector_stores.setdefault(name, store)
+    return store
+
+def get_schema_index_mode() -> str:
+    """
+    Return how schemas are indexed and searched, from SCHEMA_INDEX_MODE: "table" (default), one point per
+    table embedding its full DDL, or "column", one point per column and search results trimmed to the
+    matching columns. Switching the mode requires a rescan.
+    """
+    mode = os.getenv("SCHEMA_INDEX_MODE", "table")
+    if mode not in ("table", "column"):
+        raise ValueError(f"Unknown schema index mode: {mode}")
+    return mode
+
+def get_schema_vector_store() -> VectorStore:
+    """
+    Return the vector store of the schema index of the current mode.
+    """
+    return get_vector_store(column_collection_name if get_schema_index_mode() == "column" else collection_name)
+
+def search_schema_embeddings(user_query, limit=5):
+    """
+    Search the tables relevant to a question in the schema index.
+
+    With SCHEMA_RETRIEVAL=hybrid (default) the vector search is fused with a BM25 search over the table
+    names, column names and comments of the compiled catalog by reciprocal rank fusion, so identifiers
+    quoted in the question are found even when their embeddings rank them low. Both sides contribute
+    their SCHEMA_HYBRID_CANDIDATES (20) best tables, SCHEMA_HYBRID_RRF_K (60) damps the rank differences.
+    SCHEMA_RETRIEVAL=vector only runs the vector search.
+
+    :param user_query: The question
+    :param limit: Maximum number of tables to return
+    :return: Search results with the 'database', 'table' and 'schema' payload of the schema index, best first
+    """
+    retrieval = os.getenv("SCHEMA_RETRIEVAL", "hybrid")
+    if retrieval not in ("hybrid", "vector"):
+        raise ValueError(f"Unknown schema retrieval: {retrieval}")
+    column_mode = get_schema_index_mode() == "column"
+    candidates = max(limit, int(os.getenv("SCHEMA_HYBRID_CANDIDATES", "20"))) if retrieval == "hybrid" else limit
+    query_embedding = encode_texts([user_query])[0]
+    # query_embedding = generate_embedding_with_ollama(user_query)
+    if column_mode:
+        vector_results = search_schema_columns(query_embedding, limit=candidates)
+    else:
+        vector_results = get_vector_store().search(query_embedding, limit=candidates)  # Adjust the limit based on how many results you want
+    if retrieval == "vector":
+        return vector_results
 
-        # Extract the index IDs from the search result
-        index_ids = [point.id for point in search_result[0]]
+    lexical_index = load_compiled_catalog(src.PROJECT_FOLDER).get('lexical')
+    if not lexical_index:
+        return vector_results[:limit]
+    by_key = {f"{result.payload['database']}.{result.payload['table']}": result for result in vector_results}
+    lexical_keys = [table_key for table_key, _ in search_lexical(lexical_index, user_query, limit=candidates)]
+    fused = reciprocal_rank_fusion(list(by_key), lexical_keys,
+                                   k=int(os.getenv("SCHEMA_HYBRID_RRF_K", "60")))[:limit]
 
-        return index_ids
+    missing = [table_key for table_key, _ in fused if table_key not in by_key]
+    if missing:
+        # tables only found by the lexical search are loaded from the schema index
+        if column_mode:
+            by_key.update(retrieve_schema_columns(missing, user_query))
+        else:
+            for result in get_vector_store().retrieve([schema_point_id(*table_key.split(".", 1)) for table_key in missing]):
+                by_key[f"{result.payload['database']}.{result.payload['table']}"] = result
 
+    results = []
+    for table_key, score in fused:
+        result = by_key.get(table_key)
+        if result is None:
+            logger.warning(f"Table {table_key} of the catalog is missing from the schema index, rescan the database")
+            continue
+        results.append(SearchResult(id=str(result.id), score=score, payload=result.payload))
+    logger.debug(f"Hybrid schema search: {len(vector_results)} vector and {len(lexical_keys)} lexical candidate(s), "
+                 f"{sum(key in lexical_keys for key, _ in fused)} of {len(fused)} table(s) found lexically")
+    return results
+
+def search_schema_columns(query_embedding, limit=5):
+    """
+    Search the column index and group the hits into at most limit tables, ranked by their best column.
+    The schema of each table is trimmed to its key columns, needed to join it, and its best matching
+    columns (at most SCHEMA_COLUMNS_PER_TABLE, 10 by default) among the SCHEMA_COLUMN_SEARCH_LIMIT (50) top hits.
+
+    :param query_embedding: Embedding of the question
+    :param limit: Maximum number of tables to return
+    :return: Search results shaped like the ones of the table index, with the matching 'columns' in the payload
+    """
+    columns_per_table = int(os.getenv("SCHEMA_COLUMNS_PER_TABLE", "10"))
+    hits = {}
+    for hit in get_vector_store(column_collection_name).search(
+            query_embedding, limit=int(os.getenv("SCHEMA_COLUMN_SEARCH_LIMIT", "50"))):
+        key = (hit.payload['database'], hit.payload['table'])
+        if key not in hits and len(hits) == limit:
+            continue
+        table_hits = hits.setdefault(key, [])
+        if len(table_hits) < columns_per_table:
+            table_hits.append(hit)
+    return [trimmed_table_result(db_name, table_name, table_hits) for (db_name, table_name), table_hits in hits.items()]
+
+def retrieve_schema_columns(table_keys, user_query) -> dict:
+    """
+    Load the column points of tables found by the lexical search: the columns whose names share a term
+    with the question, or the first columns of the table if none does.
+
+    :return: Dictionary of '<database>.<table>' to the trimmed search result of the table
+    """
+    columns_per_table = int(os.getenv("SCHEMA_COLUMNS_PER_TABLE", "10"))
+    catalog_columns = load_compiled_catalog(src.PROJECT_FOLDER)['columns']
+    question_terms = set().union(*query_terms(user_query))
+    point_ids = []
+    for table_key in table_keys:
+        db_name, table_name = table_key.split(".", 1)
+        columns = catalog_columns.get(table_key, [])
+        matched = [column for column in columns if question_terms.intersection(tokenize(column))] or columns
+        point_ids.extend(schema_column_point_id(db_name, table_name, column) for column in matched[:columns_per_table])
+    hits = {}
+    for hit in get_vector_store(column_collection_name).retrieve(point_ids):
+        hits.setdefault(f"{hit.payload['database']}.{hit.payload['table']}", []).append(hit)
+    return {table_key: trimmed_table_result(*table_key.split(".", 1), table_hits) for table_key, table_hits in hits.items()}
+
+def trimmed_table_result(db_name, table_name, table_hits) -> SearchResult:
+    """
+    Assemble the column hits of a table into a table search result, scored by its first hit.
+    """
+    columns = dict(table_hits[0].payload['keys'])
+    for hit in sorted(table_hits, key=lambda hit: hit.payload['position']):
+        columns.setdefault(hit.payload['column'], hit.payload['column_info'])
+    return SearchResult(
+        id=schema_point_id(db_name, table_name),
+        score=table_hits[0].score,
+        payload={"database": db_name, "table": table_name,
+                 "columns": [hit.payload['column'] for hit in table_hits],
+                 "schema": {"columns": columns, "row_count": table_hits[0].payload.get('row_count')}}
+    )
+
+def retrieve_index_ids_by_payload(payload_filter: dict, limit: int = 100):
+    """
+    Retrieve index IDs from the vector store based on payload values.
+
+    :param payload_filter: A dictionary specifying the payload filter conditions
+    :param limit: Maximum number of results to return (default: 100)
+    :return: A list of index IDs matching the payload filter
+    """
+    try:
+        return get_vector_store().find_ids(payload_filter, limit=limit)
     except Exception as e:
         logger.error(f"Error retrieving index IDs by payload: {e}")
         return []
 
 
-def create_and_store_schema_embeddings(db_schemas):
+def schema_point_id(db_name, table_name) -> str:
+    """
+    Derive a stable point ID for a table, so re-indexing overwrites the previous point without a lookup.
+    """
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"cerebro://{db_name}/{table_name}"))
+
+def schema_column_point_id(db_name, table_name, column_name) -> str:
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"cerebro://{db_name}/{table_name}/{column_name}"))
+
+def is_key_column(column_info) -> bool:
+    return any(constraint == "PK" or constraint.startswith("FK") for constraint in column_info.get('constraints') or [])
+
+def column_schema_text(db_name, table_name, column_name, column_info) -> str:
+    description = f", Description: {column_info['description']}" if column_info.get('description') else ''
+    return f"Database: {db_name}, Table: {table_name}, Column: {column_name}, Type: {column_info['type']}{description}"
+
+def schema_table_points(db_name, db_info, table_names):
+    """
+    Yield the (point ID, text to embed, payload) of each table, embedding its full DDL.
     """
-    Create schema embeddings from schema info and store them in the Qdrant vector database.
+    for table_name in table_names:
+        table_info = db_info['tables'][table_name]
+        # schema_text = create_schema_text(db_name, table_name, table_info)
+        yield (schema_point_id(db_name, table_name), table_info_to_ddl(db_name, table_name, table_info),
+               {"database": db_name, "table": table_name, "schema": table_info})
+
+def schema_column_points(db_name, db_info, table_names):
+    """
+    Yield the (point ID, text to embed, payload) of each column. Every payload carries the key columns of
+    its table, so search results can be turned into a joinable DDL without loading the table.
+    """
+    for table_name in table_names:
+        table_info = db_info['tables'][table_name]
+        keys = {column_name: column_info for column_name, column_info in table_info['columns'].items()
+                if is_key_column(column_info)}
+        for position, (column_name, column_info) in enumerate(table_info['columns'].items()):
+            yield (schema_column_point_id(db_name, table_name, column_name),
+                   column_schema_text(db_name, table_name, column_name, column_info),
+                   {"database": db_name, "table": table_name, "column": column_name, "position": position,
+                    "column_info": column_info, "keys": keys, "row_count": table_info.get('row_count')})
+
+def create_and_store_schema_embeddings(db_schemas, tables=None):
+    """
+    Create schema embeddings from schema info and store them in the vector store.
+    Texts are encoded in batches and upserted in bulk under stable point IDs; points left over
+    for the indexed tables from earlier (randomly keyed) runs or dropped columns are removed afterwards,
+    a batch of whole tables of up to EMBEDDING_CHUNK_SIZE points at a time. A full re-index also removes
+    the points of the tables the database no longer has.
+    Depending on the schema index mode (see get_schema_index_mode) a point is stored per table or per column.
     
-    :param client: Initialized QdrantClient
-    :param collection_name: Name of the collection to store embeddings
-    :param schema_info: Dictionary containing schema information
+    :param db_schemas: Dictionary containing the schema information per database
+    :param tables: Optional dictionary of database name to the list of table names to (re)embed;
+                   all tables are embedded when not provided
     """
+    chunk_size = int(os.getenv("EMBEDDING_CHUNK_SIZE", "4096"))
+    column_mode = get_schema_index_mode() == "column"
+    store = get_schema_vector_store()
+
     for db_name, db_info in db_schemas.items():
-        for table_name, table_info in db_info['tables'].items():
-            # Create a string representation of the schema
-            # schema_text = create_schema_text(db_name, table_name, table_info)
-            schema_text = table_info_to_ddl(db_name, table_name, table_info)
-            
-            # Generate embedding
-            embedding = model.encode(schema_text).tolist()
-            # embedding = generate_embedding_with_ollama(schema_text)
-            existing_ids = retrieve_index_ids_by_payload({"database": db_name, "table": table_name})
-            q_id = existing_ids[0] if len(existing_ids) > 0 else str(uuid.uuid4())
-            if len(existing_ids) > 0:
-                logger.debug(f"Updating {db_name}.{table_name} in Qdrant")
-            else:
-                logger.debug(f"Inserting {db_name}.{table_name} into Qdrant")
-            # Store in Qdrant
-            client.upsert(
-                collection_name=collection_name,
-                points=[
-                    models.PointStruct(
-                        id=q_id,
-                        vector=embedding,
-                        payload={"database": db_name, "table": table_name, "schema": table_info}
-                    )
-                ]
-            )
+        if tables is not None and not tables.get(db_name):
+            continue
+        table_names = [table_name for table_name in db_info['tables']
+                       if tables is None or table_name in tables[db_name]]
+        if tables is not None and not table_names:
+            continue
+        points = list((schema_column_points if column_mode else schema_table_points)(db_name, db_info, table_names))
+        for start in range(0, len(points), chunk_size):
+            chunk = points[start:start + chunk_size]
+            # Generate embeddings
+            embeddings = encode_texts([text for _, text, _ in chunk])
+            chunk_ids = [point_id for point_id, _, _ in chunk]
+            store.upsert(chunk_ids, embeddings, [payload for _, _, payload in chunk])
+            logger.debug(f"Stored {start + len(chunk)}/{len(points)} schema embeddings of {db_name}")
+
+        # Remove points of the indexed tables stored under other IDs, restricted to a batch of tables per
+        # request, so the kept IDs of a request stay bounded however large the database is
+        table_point_ids = {table_name: [] for table_name in table_names}
+        for point_id, _, payload in points:
+            table_point_ids[payload['table']].append(point_id)
+        batch_tables, batch_ids = [], []
+        for table_name, table_ids in table_point_ids.items():
+            if batch_tables and len(batch_ids) + len(table_ids) > chunk_size:
+                store.delete({"database": db_name, "table": batch_tables}, keep_ids=batch_ids)
+                batch_tables, batch_ids = [], []
+            batch_tables.append(table_name)
+            batch_ids.extend(table_ids)
+        if batch_tables:
+            store.delete({"database": db_name, "table": batch_tables}, keep_ids=batch_ids)
+        if tables is None:
+            store.delete({"database": db_name}, keep_filter={"table": table_names})
+        logger.info(f"Indexed {len(table_names)} table(s) of {db_name}" + (f" ({len(points)} columns)" if column_mode else ""))
+
+def delete_schema_embeddings(db_name, table_names):
+    """
+    Remove the schema embeddings of dropped tables from the vector store.
+
+    :param db_name: Name of the database the tables belonged to
+    :param table_names: List of table names to remove
+    """
+    if not table_names:
+        return
+    get_schema_vector_store().delete({"database": db_name, "table": list(table_names)})
+    logger.debug(f"Removed {len(table_names)} table(s) of {db_name} from the vector store")
@@ -0,0 +1,138 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import logging
+import threading
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# quoted values and numbers of a question, e.g. the ids, years or names its SQL filters on
+QUESTION_LITERAL_PATTERN = re.compile(r'"[^"]*"|\'[^\']*\'|\d+(?:[.,:/-]\d+)*')
+
+def question_literals(question: str) -> list[str]:
+    return sorted(literal.lower() for literal in QUESTION_LITERAL_PATTERN.findall(question))
+
+class SemanticCache:
+    """
+    Persistent cache of validated SQL keyed by the meaning of the question.
+
+    Each entry holds the embedding of a question, the SQL statements that executed successfully for it and
+    the catalog version they were generated against. A lookup returns the most similar question of the same
+    catalog version if its cosine similarity reaches the threshold and both questions mention the same
+    numbers and quoted values, as embeddings hardly tell "orders of customer 5" from "customer 6". Entries of other catalog versions are
+    dropped once the catalog changes, and above max_entries the least recently used entries are evicted.
+    """
+
+    def __init__(self, path, threshold=0.95, max_entries=10000):
+        self.path = path
+        self.threshold = threshold
+        self.max_entries = max_entries
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                catalog_version TEXT NOT NULL,
+                question TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                sql TEXT NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0,
+                last_used REAL NOT NULL
+            )
+        """)
+        self._conn.commit()
+        self._version = None
+        self._ids = np.empty(0, dtype=np.int64)
+        self._vectors = np.empty((0, 0), dtype=np.float32)
+
+    @staticmethod
+    def _normalize(vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _activate(self, catalog_version):
+        # called with the lock held
+        if self._version == catalog_version:
+            return
+        deleted = self._conn.execute("DELETE FROM entries WHERE catalog_version != ?", (catalog_version,)).rowcount
+        self._conn.commit()
+        if deleted:
+            logger.info(f"Invalidated {deleted} semantic cache entries of previous catalog versions")
+        rows = self._conn.execute("SELECT id, vector FROM entries WHERE catalog_version = ?", (catalog_version,)).fetchall()
+        self._ids = np.array([row[0] for row in rows], dtype=np.int64)
+        self._vectors = np.array([np.frombuffer(row[1], dtype=np.float32) for row in rows], dtype=np.float32)
+        self._version = catalog_version
+
+    def lookup(self, question, vector, catalog_version):
+        """
+        Find the cached SQL of the most similar question asked against the same catalog version,
+        among the questions with the same literals.
+
+        :param question: The question
+        :param vector: Embedding of the question
+        :param catalog_version: Version hash of the compiled catalog
+        :return: A dictionary with the cached 'id', 'question', 'sql' statements and 'similarity', or None
+        """
+        query = self._normalize(vector)
+        with self._lock:
+            self._activate(catalog_version)
+            if len(self._ids) == 0:
+                return None
+            similarities = self._vectors @ query
+            candidates = np.flatnonzero(similarities >= self.threshold)
+            literals = question_literals(question)
+            for best in candidates[np.argsort(-similarities[candidates])]:
+                entry_id = int(self._ids[best])
+                cached_question, statements = self._conn.execute(
+                    "SELECT question, sql FROM entries WHERE id = ?", (entry_id,)).fetchone()
+                if question_literals(cached_question) == literals:
+                    break
+            else:
+                return None
+            similarity = float(similarities[best])
+            self._conn.execute("UPDATE entries SET hits = hits + 1, last_used = ? WHERE id = ?", (time.time(), entry_id))
+            self._conn.commit()
+        logger.info(f"Semantic cache hit ({similarity:.3f}) for question: {cached_question}")
+        return {'id': entry_id, 'question': cached_question, 'sql': json.loads(statements), 'similarity': similarity}
+
+    def store(self, question, vector, statements, catalog_version):
+        """
+        Cache the validated SQL statements of a question. Callers only store read-only statements,
+        which can be replayed safely.
+        """
+        vector = self._normalize(vector)
+        with self._lock:
+            self._activate(catalog_version)
+            cursor = self._conn.execute(
+                "INSERT INTO entries (catalog_version, question, vector, sql, last_used) VALUES (?, ?, ?, ?, ?)",
+                (catalog_version, question, vector.tobytes(), json.dumps(statements), time.time()))
+            self._ids = np.append(self._ids, cursor.lastrowid)
+            self._vectors = np.vstack([self._vectors.reshape(-1, len(vector)), vector])
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()
+            if count > self.max_entries:
+                evicted = [row[0] for row in self._conn.execute(
+                    "SELECT id FROM entries ORDER BY last_used LIMIT ?", (count - self.max_entries,)).fetchall()]
+                self._conn.executemany("DELETE FROM entries WHERE id = ?", [(entry_id,) for entry_id in evicted])
+                keep = ~np.isin(self._ids, evicted)
+                self._ids, self._vectors = self._ids[keep], self._vectors[keep]
+            self._conn.commit()
+
+    def invalidate(self, entry_id):
+        """
+        Drop an entry whose SQL no longer executes successfully.
+        """
+        with self._lock:
+            self._conn.execute("DELETE FROM entries WHERE id = ?", (entry_id,))
+            self._conn.commit()
+            keep = self._ids != entry_id
+            self._ids, self._vectors = self._ids[keep], self._vectors[keep]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
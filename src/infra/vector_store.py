@@ -0,0 +1,185 @@
+import os
+import json
+import logging
+import threading
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class SearchResult:
+    """
+    A search hit, exposing the same id, score and payload attributes as Qdrant's ScoredPoint.
+    """
+    id: str
+    score: float
+    payload: dict = field(default_factory=dict)
+
+def matches_filter(payload: dict, payload_filter: dict) -> bool:
+    """
+    Check a payload against a filter of key -> value; a list, tuple or set value matches any of its items.
+    """
+    for key, expected in payload_filter.items():
+        value = payload.get(key)
+        if isinstance(expected, (list, tuple, set)):
+            if value not in expected:
+                return False
+        elif value != expected:
+            return False
+    return True
+
+class VectorStore(ABC):
+    """
+    Interface of the vector store behind the schema embedding functions in src.infra.qdrant.
+
+    Payload filters are dictionaries of payload key -> value, where a list value matches any of its items.
+    """
+
+    @abstractmethod
+    def upsert(self, ids, vectors, payloads):
+        """Insert or replace the points with the given ids."""
+
+    @abstractmethod
+    def search(self, vector, limit=5, payload_filter=None) -> list[SearchResult]:
+        """Return the limit points most similar (cosine) to the vector, optionally restricted by a payload filter."""
+
+    @abstractmethod
+    def retrieve(self, ids) -> list[SearchResult]:
+        """Return the stored points with the given ids (score 1.0), skipping unknown ids."""
+
+    @abstractmethod
+    def find_ids(self, payload_filter, limit=100) -> list[str]:
+        """Return the ids of the points matching the payload filter."""
+
+    @abstractmethod
+    def delete(self, payload_filter, keep_ids=None, keep_filter=None):
+        """Delete the points matching the payload filter, except the ones listed in keep_ids or matching keep_filter."""
+
+    def close(self):
+        """Release the resources held by the store."""
+
+class LocalVectorStore(VectorStore):
+    """
+    In-process vector store for small catalogs and tests, needing no external service.
+
+    Embeddings are L2-normalized and kept in a float32 matrix persisted as <name>.npy next to a
+    <name>.json file holding the ids and payloads. The matrix is opened as a read-only memory map,
+    so searching is a single matrix-vector product (cosine similarity) over the mapped file.
+    Writes rebuild the matrix and replace both files atomically. The matrix, ids, payloads and
+    row index are published together as one immutable state, so readers never mix two versions
+    without taking the lock that serializes the writers.
+    """
+
+    def __init__(self, folder, name):
+        self.folder = folder
+        self.name = name
+        self.vectors_path = os.path.join(folder, f"{name}.npy")
+        self.metadata_path = os.path.join(folder, f"{name}.json")
+        self._lock = threading.Lock()
+        # (vectors, ids, payloads, rows), replaced as a whole
+        self._state = (None, [], [], {})
+        self._load()
+
+    def _load(self):
+        if not (os.path.exists(self.vectors_path) and os.path.exists(self.metadata_path)):
+            return
+        with open(self.metadata_path, 'r') as f:
+            metadata = json.load(f)
+        ids = metadata['ids']
+        self._state = (np.load(self.vectors_path, mmap_mode='r'), ids, metadata['payloads'],
+                       {point_id: row for row, point_id in enumerate(ids)})
+        logger.debug(f"Loaded {len(ids)} vectors from {self.vectors_path}")
+
+    def _persist(self, vectors, ids, payloads):
+        os.makedirs(self.folder, exist_ok=True)
+        tmp_vectors_path = f"{self.vectors_path}.tmp.npy"
+        tmp_metadata_path = f"{self.metadata_path}.tmp"
+        np.save(tmp_vectors_path, vectors)
+        with open(tmp_metadata_path, 'w') as f:
+            json.dump({'ids': ids, 'payloads': payloads}, f, default=str)
+        os.replace(tmp_vectors_path, self.vectors_path)
+        os.replace(tmp_metadata_path, self.metadata_path)
+        self._state = (np.load(self.vectors_path, mmap_mode='r'), ids, payloads,
+                       {point_id: row for row, point_id in enumerate(ids)})
+
+    @staticmethod
+    def _normalize(vectors) -> np.ndarray:
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def upsert(self, ids, vectors, payloads):
+        ids = [str(point_id) for point_id in ids]
+        new_vectors = self._normalize(vectors)
+        with self._lock:
+            current_vectors, current_ids, current_payloads, current_rows = self._state
+            all_ids = list(current_ids)
+            all_payloads = list(current_payloads)
+            existing = np.array(current_vectors) if current_vectors is not None else np.empty((0, new_vectors.shape[1]), dtype=np.float32)
+            rows = dict(current_rows)
+            appended = []
+            for point_id, vector, payload in zip(ids, new_vectors, payloads):
+                row = rows.get(point_id)
+                if row is not None and row < len(existing):
+                    existing[row] = vector
+                    all_payloads[row] = payload
+                else:
+                    rows[point_id] = len(all_ids)
+                    all_ids.append(point_id)
+                    all_payloads.append(payload)
+                    appended.append(vector)
+            if appended:
+                existing = np.vstack([existing, np.asarray(appended, dtype=np.float32)])
+            self._persist(existing, all_ids, all_payloads)
+
+    @staticmethod
+    def _filter_rows(payloads, payload_filter) -> np.ndarray:
+        return np.fromiter((row for row, payload in enumerate(payloads) if matches_filter(payload, payload_filter)),
+                           dtype=np.int64)
+
+    def search(self, vector, limit=5, payload_filter=None) -> list[SearchResult]:
+        vectors, ids, payloads, _ = self._state
+        if vectors is None or len(ids) == 0:
+            return []
+        query = self._normalize(vector)[0]
+        if payload_filter:
+            rows = self._filter_rows(payloads, payload_filter)
+            if len(rows) == 0:
+                return []
+            scores = vectors[rows] @ query
+        else:
+            rows = None
+            scores = vectors @ query
+        limit = min(limit, len(scores))
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        top = top[np.argsort(-scores[top])]
+        return [SearchResult(id=ids[row], score=float(scores[i]), payload=payloads[row])
+                for i, row in ((i, rows[i] if rows is not None else i) for i in top)]
+
+    def retrieve(self, ids) -> list[SearchResult]:
+        _, _, payloads, rows = self._state
+        return [SearchResult(id=str(point_id), score=1.0, payload=payloads[rows[str(point_id)]])
+                for point_id in ids if str(point_id) in rows]
+
+    def find_ids(self, payload_filter, limit=100) -> list[str]:
+        _, ids, payloads, _ = self._state
+        return [ids[row] for row in self._filter_rows(payloads, payload_filter)[:limit]]
+
+    def delete(self, payload_filter, keep_ids=None, keep_filter=None):
+        keep_ids = {str(point_id) for point_id in keep_ids or ()}
+        with self._lock:
+            vectors, ids, payloads, _ = self._state
+            if vectors is None:
+                return
+            keep_rows = [row for row, (point_id, payload) in enumerate(zip(ids, payloads))
+                         if point_id in keep_ids or not matches_filter(payload, payload_filter)
+                         or (keep_filter and matches_filter(payload, keep_filter))]
+            if len(keep_rows) == len(ids):
+                return
+            logger.debug(f"Deleting {len(ids) - len(keep_rows)} vector(s) from {self.vectors_path}")
+            self._persist(np.array(vectors[keep_rows], dtype=np.float32),
+                          [ids[row] for row in keep_rows],
+                          [payloads[row] for row in keep_rows])
@@ -0,0 +1,122 @@
+import re
+import math
+import logging
+
+logger = logging.getLogger(__name__)
+
+WORD_PATTERN = re.compile(r"[a-z0-9]+(?:_[a-z0-9]+)*")
+# BM25 parameters; table name terms count as TABLE_NAME_WEIGHT occurrences, so a table named after a
+# term ranks above the tables merely having a column of that name
+BM25_K1 = 1.2
+BM25_B = 0.75
+TABLE_NAME_WEIGHT = 3
+
+def term_variants(term: str) -> set[str]:
+    """
+    The term and the singular forms it may be the plural of, so "films", "categories", "addresses" and
+    "cases" of a question match the tables film, category, address and case. Only question terms are
+    expanded, the index holds the terms as written, which avoids conflating unrelated words.
+    """
+    variants = {term}
+    if len(term) > 3 and term.endswith("s") and not term.endswith("ss"):
+        variants.add(term[:-1])
+        if term.endswith("es"):
+            variants.add(term[:-2])
+        if len(term) > 4 and term.endswith("ies"):
+            variants.add(term[:-3] + "y")
+    return variants
+
+def tokenize(text: str) -> list[str]:
+    """
+    Split text into lowercase terms. Identifiers are kept whole and split into their parts as well,
+    so "rental_rate" matches the column rental_rate exactly, and "rate" partially.
+    """
+    terms = []
+    for word in WORD_PATTERN.findall(text.lower()):
+        terms.append(word)
+        if "_" in word:
+            terms.extend(word.split("_"))
+    return terms
+
+def query_terms(text: str) -> list[set[str]]:
+    """
+    The distinct terms of a question, each as the set of its variants (see term_variants).
+    """
+    return [term_variants(term) for term in dict.fromkeys(tokenize(text))]
+
+def table_terms(table_name: str, table_info: dict) -> list[str]:
+    terms = tokenize(table_name) * TABLE_NAME_WEIGHT
+    if table_info.get('description'):
+        terms.extend(tokenize(table_info['description']))
+    for column_name, column_info in table_info['columns'].items():
+        terms.extend(tokenize(column_name))
+        if column_info.get('description'):
+            terms.extend(tokenize(column_info['description']))
+    return terms
+
+def build_lexical_index(all_db_info) -> dict:
+    """
+    Build a BM25 index over the table names, column names and comments of the scanned databases.
+    The BM25 weight of every (term, table) pair is computed here, so a search only sums posting weights.
+
+    Args:
+    all_db_info (dict): The database information of all databases, keyed by database name.
+
+    Returns:
+    dict: The indexed 'tables' ('<database>.<table>' keys) and the 'postings' of each term,
+    a list of [table position, BM25 weight] pairs.
+    """
+    tables = []
+    term_counts = []
+    for db_name, db_info in sorted(all_db_info.items()):
+        for table_name, table_info in db_info['tables'].items():
+            counts = {}
+            for term in table_terms(table_name, table_info):
+                counts[term] = counts.get(term, 0) + 1
+            tables.append(f"{db_name}.{table_name}")
+            term_counts.append(counts)
+
+    lengths = [sum(counts.values()) for counts in term_counts]
+    average_length = sum(lengths) / len(lengths) if lengths else 0.0
+    document_frequency = {}
+    for counts in term_counts:
+        for term in counts:
+            document_frequency[term] = document_frequency.get(term, 0) + 1
+
+    postings = {}
+    for position, (counts, length) in enumerate(zip(term_counts, lengths)):
+        normalization = BM25_K1 * (1 - BM25_B + BM25_B * length / average_length)
+        for term, frequency in counts.items():
+            idf = math.log(1 + (len(tables) - document_frequency[term] + 0.5) / (document_frequency[term] + 0.5))
+            weight = idf * frequency * (BM25_K1 + 1) / (frequency + normalization)
+            postings.setdefault(term, []).append([position, round(weight, 4)])
+    return {'tables': tables, 'postings': postings}
+
+def search_lexical(index: dict, query: str, limit=5) -> list[tuple[str, float]]:
+    """
+    Rank the tables of the lexical index by their BM25 score for the query. Each question term scores
+    with its best matching variant.
+
+    Returns:
+    list: Up to limit ('<database>.<table>', score) pairs, best first; tables matching no term are left out.
+    """
+    scores = {}
+    for variants in query_terms(query):
+        term_scores = {}
+        for variant in variants:
+            for position, weight in index['postings'].get(variant, ()):
+                term_scores[position] = max(term_scores.get(position, 0.0), weight)
+        for position, weight in term_scores.items():
+            scores[position] = scores.get(position, 0.0) + weight
+    best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+    return [(index['tables'][position], score) for position, score in best]
+
+def reciprocal_rank_fusion(*rankings, k=60) -> list[tuple[str, float]]:
+    """
+    Fuse rankings of keys (best first) by summing 1 / (k + rank) over the rankings each key appears in.
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, start=1):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
@@ -1,10 +1,16 @@
+import os
+import re
+import json
 import requests
 import logging
 from os.path import join
 from src.utils import read_and_prepare_prompt
+from src.infra.ollama import post, run_async
+from src import telemetry
 from src import PROJECT_FOLDER
 logger = logging.getLogger(__name__)
 assets = join(PROJECT_FOLDER, "assets")
+SQL_FENCE_PATTERN = re.compile(r"```sql", re.IGNORECASE)
 
 def generate_embedding_with_ollama(text: str, model: str = "all-minilm-l6-v2") -> list:
     """
@@ -17,15 +23,13 @@ def generate_embedding_with_ollama(text: str, model: str = "all-minilm-l6-v2") -
     Returns:
     list: The generated embedding as a list of floats.
     """
-    url = "http://localhost:11434/api/embeddings"
-    
     payload = {
         "model": model,
         "prompt": text
     }
     
     try:
-        response = requests.post(url, json=payload)
+        response = post("/api/embeddings", payload)
         response.raise_for_status()  # Raises an HTTPError for bad responses
         
         data = response.json()
@@ -42,13 +46,15 @@ def generate_embedding_with_ollama(text: str, model: str = "all-minilm-l6-v2") -
         logger.error(f"Error processing Ollama response: {e}")
         raise e
 
-def generate_sql_with_ollama(user_question, relevant_schema, all_schema=None, context=None):
+def generate_sql_with_ollama(user_question, relevant_schema, all_schema=None, context=None, options=None, cancel_event=None):
     """
     Generate SQL using a local Ollama deployment with a custom prompt.
 
     Args:
     user_question (str): The user's natural language question.
     schema_info (str): The relevant schema information.
+    options (dict): Optional Ollama model options, e.g. temperature and seed.
+    cancel_event (threading.Event): Optional event aborting a streamed generation once set.
 
     Returns:
     str: The generated SQL query.
@@ -61,7 +67,8 @@ def generate_sql_with_ollama(user_question, relevant_schema, all_schema=None, co
                                      relevant_schema=relevant_schema, 
                                      full_schema=all_schema)
     logger.debug(f"Prompt: {prompt}")
-    return prompt_llm(prompt, system_prompt=system_prompt, context=context, model="llama3.1")
+    return prompt_llm(prompt, system_prompt=system_prompt, context=context, model="llama3.1", stop_at_sql_fence=True,
+                      options=options, cancel_event=cancel_event)
     # return process_user_query(prompt, system_prompt=system_prompt, model="sqlcoder")
 
 def generate_refined_sql(user_query, 
@@ -70,7 +77,9 @@ def generate_refined_sql(user_query,
                         all_schema=None, 
                         error_message=None,
                         context=None,
-                        model="llama3.1"):
+                        model="llama3.1",
+                        options=None,
+                        cancel_event=None):
     global assets
     system_prompt = read_and_prepare_prompt(join(assets, "generate_sql_system.prompt"))
     prompt = read_and_prepare_prompt(join(assets, "retry.prompt"), 
@@ -80,7 +89,8 @@ def generate_refined_sql(user_query,
                                      full_schema=all_schema,
                                      error_message=error_message)
     logger.debug(f"Refined Prompt: {prompt}")
-    return prompt_llm(prompt, system_prompt=system_prompt, context=context, model=model)
+    return prompt_llm(prompt, system_prompt=system_prompt, context=context, model=model, stop_at_sql_fence=True,
+                      options=options, cancel_event=cancel_event)
 
 def improve_prompt(user_query, model="llama3.1"):
     global assets
@@ -89,35 +99,170 @@ def improve_prompt(user_query, model="llama3.1"):
     logger.info(f"Improved query: {response['response']}")
     return response['response']
 
-def prompt_llm(prompt, system_prompt=None, context=None, model='llama3.1'):
-    ollama_url = "http://localhost:11434/api/generate"
+def prompt_llm(prompt, system_prompt=None, context=None, model='llama3.1', stream=None, stop_at_sql_fence=False,
+               options=None, cancel_event=None):
+    """
+    Send a prompt to the Ollama generate API.
+
+    Args:
+    prompt (str): The prompt to send.
+    system_prompt (str): Optional system prompt.
+    context (list): Optional context returned by a previous call, to continue the conversation.
+    model (str): The name of the Ollama model to use.
+    stream (bool): Whether to consume the response as a token stream. Defaults to OLLAMA_STREAM (on).
+    stop_at_sql_fence (bool): When streaming, stop the generation once the ```sql block of the answer is closed.
+    options (dict): Optional Ollama model options, e.g. temperature and seed.
+    cancel_event (threading.Event): When streaming, abort the generation once the event is set.
+
+    Returns:
+    dict: The 'response' text, the 'context' for follow-up calls, whether the generation was 'stopped_early'
+    and the 'prompt_tokens' and 'completion_tokens' reported by Ollama (None if unknown).
+    """
+    if stream is None:
+        stream = os.getenv('OLLAMA_STREAM', '1') != '0'
     payload = {
         "model": model,
         "prompt": prompt,
         "system": system_prompt,
-        "stream": False,
+        "stream": stream,
         "context": context
     }
     if context:
         payload.update(context = context)
+    if options:
+        payload.update(options = options)
 
     try:
-        response = requests.post(ollama_url, json=payload)
-        response.raise_for_status()
-        result = response.json()
-        return {
-            'response': result['response'].strip(),
-            'context': result['context']
-        }
+        if stream:
+            result = stream_llm_response(payload, context=context, stop_at_sql_fence=stop_at_sql_fence,
+                                         cancel_event=cancel_event)
+        else:
+            response = post("/api/generate", payload)
+            response.raise_for_status()
+            body = response.json()
+            result = {
+                'response': body['response'].strip(),
+                'context': body['context'],
+                'stopped_early': False,
+                'prompt_tokens': body.get('prompt_eval_count'),
+                'completion_tokens': body.get('eval_count')
+            }
     except requests.RequestException as e:
-        logger.error(f"Error calling Ollama API: {e}")
-        if isinstance(e, requests.HTTPError):
+        log_request_error(e)
+        raise e
+    telemetry.record_llm_usage(model, result['prompt_tokens'], result['completion_tokens'])
+    return result
+
+def sql_fence_end(text: str) -> int:
+    """
+    Return the position right after the fence closing the first ```sql block of the text, or -1 if it is not closed yet.
+    """
+    opening = SQL_FENCE_PATTERN.search(text)
+    if not opening:
+        return -1
+    closing = text.find("```", opening.end())
+    return closing + 3 if closing >= 0 else -1
+
+def stream_llm_response(payload, context=None, stop_at_sql_fence=False, cancel_event=None) -> dict:
+    """
+    Consume the NDJSON token stream of the Ollama generate API.
+
+    With stop_at_sql_fence, Ollama is asked to stop at a fence followed by a line break (the opening ```sql
+    fence doesn't match), so it ends the generation right after the SQL block and still sends the final
+    chunk with the context. If the closing fence is seen without the generation ending within a few more
+    chunks, the stream is closed, which makes Ollama abort the generation; the context passed in is then
+    returned, as Ollama only sends the context of a generation in its final chunk. Setting cancel_event
+    aborts the generation the same way. The token counts also come with the final chunk; without it the
+    prompt tokens are unknown and the streamed chunks (one token each) are counted as completion tokens.
+    """
+    if stop_at_sql_fence:
+        payload = {**payload, "options": {**payload.get("options", {}), "stop": ["```\n"]}}
+    parts = []
+    grace_chunks = int(os.getenv('OLLAMA_STOP_GRACE_CHUNKS', '3'))
+    fence_seen_at = None
+    with post("/api/generate", payload, stream=True) as response:
+        response.raise_for_status()
+        for chunk_number, line in enumerate(response.iter_lines()):
+            if not line:
+                continue
+            chunk = json.loads(line)
+            if 'error' in chunk:
+                raise requests.HTTPError(f"Ollama API error: {chunk['error']}", response=response)
+            parts.append(chunk.get('response', ''))
+            if chunk.get('done'):
+                text = "".join(parts)
+                if stop_at_sql_fence and chunk.get('done_reason') == 'stop' and sql_fence_end(text) < 0 \
+                        and SQL_FENCE_PATTERN.search(text):
+                    # the stop sequence is not part of the response, restore the closing fence
+                    text = text.rstrip() + "\n```"
+                return {
+                    'response': text.strip(),
+                    'context': chunk.get('context', context),
+                    'stopped_early': False,
+                    'prompt_tokens': chunk.get('prompt_eval_count'),
+                    'completion_tokens': chunk.get('eval_count', len(parts))
+                }
+            if stop_at_sql_fence and fence_seen_at is None and sql_fence_end("".join(parts)) >= 0:
+                fence_seen_at = chunk_number
+            if fence_seen_at is not None and chunk_number - fence_seen_at >= grace_chunks:
+                break
+            if cancel_event is not None and cancel_event.is_set():
+                logger.debug("Generation canceled")
+                break
+
+    text = "".join(parts)
+    end = sql_fence_end(text)
+    logger.debug(f"Stopped the generation after the SQL block ({len(text) - end} trailing characters dropped)")
+    return {
+        'response': text[:end].strip() if end >= 0 else text.strip(),
+        'context': context,
+        'stopped_early': True,
+        'prompt_tokens': None,
+        'completion_tokens': len(parts)
+    }
+
+def log_request_error(e):
+    logger.error(f"Error calling Ollama API: {e}")
+    if isinstance(e, requests.HTTPError):
+        if e.response is not None:
             logger.error(f"HTTP Status Code: {e.response.status_code}")
             logger.error(f"Response Content: {e.response.text}")
-        elif isinstance(e, requests.ConnectionError):
-            logger.error("Connection Error: Unable to connect to the Ollama API server")
-        elif isinstance(e, requests.Timeout):
-            logger.error("Timeout Error: The request to Ollama API timed out")
-        else:
-            logger.error(f"Unexpected error type: {type(e).__name__}")
-        raise e
\ No newline at end of file
+    elif isinstance(e, requests.ConnectionError):
+        logger.error("Connection Error: Unable to connect to the Ollama API server")
+    elif isinstance(e, requests.Timeout):
+        logger.error("Timeout Error: The request to Ollama API timed out")
+    else:
+        logger.error(f"Unexpected error type: {type(e).__name__}")
+
+async def aprompt_llm(prompt, system_prompt=None, context=None, model='llama3.1', stream=None, stop_at_sql_fence=False):
+    """
+    Asyncio variant of prompt_llm.
+    """
+    return await run_async(prompt_llm, prompt, system_prompt=system_prompt, context=context, model=model,
+                           stream=stream, stop_at_sql_fence=stop_at_sql_fence)
+
+async def aimprove_prompt(user_query, model="llama3.1"):
+    """
+    Asyncio variant of improve_prompt.
+    """
+    return await run_async(improve_prompt, user_query, model=model)
+
+async def agenerate_sql_with_ollama(user_question, relevant_schema, all_schema=None, context=None):
+    """
+    Asyncio variant of generate_sql_with_ollama.
+    """
+    return await run_async(generate_sql_with_ollama, user_question, relevant_schema, all_schema=all_schema, context=context)
+
+async def agenerate_refined_sql(user_query, initial_sql, relevant_schema, all_schema=None, error_message=None,
+                                context=None, model="llama3.1"):
+    """
+    Asyncio variant of generate_refined_sql.
+    """
+    return await run_async(generate_refined_sql, user_query, initial_sql, relevant_schema, all_schema=all_schema,
+                           error_message=error_message, context=context, model=model)
+
+async def agenerate_embedding_with_ollama(text: str, model: str = "all-minilm-l6-v2") -> list:
+    """
+    Asyncio variant of generate_embedding_with_ollama.
+    """
+    return await run_async(generate_embedding_with_ollama, text, model=model)
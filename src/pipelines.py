@@ -1,41 +1,367 @@
-from src import PROJECT_FOLDER
+import os
+import time
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import src
+from src import telemetry
 from .llmops import improve_prompt, generate_sql_with_ollama, generate_refined_sql
 from logging import getLogger
 from tabulate import tabulate
-from .connectors.pgres import execute_sql_query
-from .utils import extract_sql_from_markdown, load_all_db_info, table_info_to_ddl
-from .infra import fetch_relevant_tables_ddl
+from .connectors.pgres import execute_sql_query, is_read_only_query, QueryCancellation
+from .utils import extract_sql_from_markdown
+from .catalog import load_compiled_catalog
+from .schema_context import build_schema_context
+from .sql_validator import validate_sql
+from .infra import search_schema_embeddings, tables_ddl, table_keys, merge_search_results
+from .infra.qdrant import encode_texts, get_semantic_cache, get_model, get_schema_vector_store, get_embedding_model_name, get_schema_index_mode
 
 
 
 logger = getLogger(__name__)
+# shared by all pipeline runs of the process, runs the independent stages of a run concurrently
+stage_executor = None
+_stage_executor_lock = threading.Lock()
 
-def execute_user_query_pipleline(query: str):
-    def execute_sql(sql):
-        # todo: chnage the database name to the one in the data source
-        rsp = execute_sql_query('dvdrental',sql)
-        if rsp["success"]:
-            if 'message' in rsp:
-                print(f"Query executed successfully. Rows affected: {rsp['message']}")
-            else:
-                table = tabulate(rsp['data'], headers=rsp['columns'], tablefmt='pretty')
-                print("Query results:")
-                print(table)
+def get_stage_executor() -> ThreadPoolExecutor:
+    """
+    Return the stage executor with PIPELINE_WORKERS (8) threads, creating it on first use,
+    so the variable can be set in the .env file loaded after the imports.
+    """
+    global stage_executor
+    if stage_executor is None:
+        with _stage_executor_lock:
+            if stage_executor is None:
+                stage_executor = ThreadPoolExecutor(max_workers=int(os.getenv('PIPELINE_WORKERS', '8')),
+                                                    thread_name_prefix="pipeline")
+    return stage_executor
+
+def traced(name, func, *args, **kwargs):
+    """
+    Call a stage function within a span named after the stage.
+    """
+    with telemetry.span(name):
+        return func(*args, **kwargs)
+
+def submit_stage(name, func, *args, **kwargs):
+    """
+    Run a stage on the stage executor, within a span that is a child of the caller's current span.
+    """
+    return get_stage_executor().submit(telemetry.bind(traced), name, func, *args, **kwargs)
+
+def prepare_query_context(query: str) -> dict:
+    """
+    Run the stages preceding SQL generation as a small DAG. The catalog load and the schema search on
+    the raw question run concurrently with improve_prompt, the schema context is built once they are done.
+    PIPELINE_RETRIEVAL selects the tables used: "both" (default) merges the speculative search on the
+    raw question with the search on the improved one, "raw" only uses the raw search (no search after
+    improve_prompt) and "improved" only the search on the improved question.
+
+    Returns:
+    dict: The 'improved_query', the 'catalog', the 'search_result', the 'relevant_tables' DDL and the 'full_schema'.
+    """
+    retrieval = os.getenv('PIPELINE_RETRIEVAL', 'both')
+    if retrieval not in ('both', 'raw', 'improved'):
+        raise ValueError(f"Unknown retrieval mode: {retrieval}")
+    catalog_future = submit_stage("load_compiled_catalog", load_compiled_catalog, src.PROJECT_FOLDER)
+    raw_search_future = submit_stage("search_schema_embeddings", search_schema_embeddings, query) \
+        if retrieval != 'improved' else None
+
+    improved_query = traced("improve_prompt", improve_prompt, query)
+    if retrieval == 'raw':
+        search_result = raw_search_future.result()
+    elif retrieval == 'improved':
+        search_result = traced("search_schema_embeddings", search_schema_embeddings, improved_query)
+    else:
+        search_result = merge_search_results(traced("search_schema_embeddings", search_schema_embeddings, improved_query),
+                                             raw_search_future.result())
+
+    catalog = catalog_future.result()
+    relevant_tables = tables_ddl(search_result)
+    if os.getenv('SCHEMA_PRUNING', '1') != '0':
+        with telemetry.span("build_schema_context") as context_span:
+            schema_context = build_schema_context(catalog, table_keys(search_result),
+                                                  include_seeds=get_schema_index_mode() != 'column')
+            context_span.set(tables=len(schema_context['tables']), schema_tokens=schema_context['tokens'],
+                             saved_tokens=schema_context['saved_tokens'])
+        full_schema = schema_context['schema']
+    else:
+        full_schema = catalog['full_schema']
+    return {
+        'improved_query': improved_query,
+        'catalog': catalog,
+        'search_result': search_result,
+        'relevant_tables': relevant_tables,
+        'full_schema': full_schema,
+    }
+
+def semantic_cache_version(catalog) -> str:
+    """
+    Cache entries are only reused with the catalog and the embedding model they were created with.
+    """
+    return f"{get_embedding_model_name()}:{catalog['version']}"
+
+def lookup_cached_sql(query: str):
+    """
+    Embed the question and look up the validated SQL of a similar question in the semantic cache.
+
+    Returns:
+    tuple: The cache hit (or None), the embedding of the question and the cache version of the current catalog.
+    """
+    catalog_future = submit_stage("load_compiled_catalog", load_compiled_catalog, src.PROJECT_FOLDER)
+    vector = traced("encode_question", encode_texts, [query])[0]
+    version = semantic_cache_version(catalog_future.result())
+    cached = get_semantic_cache().lookup(query, vector, version)
+    if cached and not all(is_read_only_query(sql) for sql in cached['sql']):
+        # entries stored before only read-only statements were cached, writes are never replayed
+        get_semantic_cache().invalidate(cached['id'])
+        cached = None
+    telemetry.record_cache("semantic", int(cached is not None), int(cached is None))
+    return cached, vector, version
+
+def check_and_execute_sql(sql, catalog, database, cancellation=None) -> dict:
+    """
+    Validate a generated statement against the catalog and execute it if no problem was found.
+    References to unknown tables or columns are reported without a round trip to the database.
+    """
+    if os.getenv('SQL_VALIDATION', '1') != '0':
+        with telemetry.span("validate_sql") as validation_span:
+            errors = validate_sql(sql, catalog, database)
+            validation_span.set(errors=len(errors))
+        if errors:
+            logger.error(f"Generated SQL failed validation: {' '.join(errors)}")
+            return {"success": False, "error": "\n".join(errors)}
+    if cancellation and cancellation.cancelled:
+        # the statement hasn't started, so it never runs
+        return {"success": False, "error": "canceling statement due to user request"}
+    return traced_execute_sql_query(database, sql, cancellation=cancellation)
+
+def traced_execute_sql_query(database, sql, cancellation=None) -> dict:
+    with telemetry.span("execute_sql_query") as execution_span:
+        rsp = execute_sql_query(database, sql, cancellation=cancellation)
+        execution_span.set(success=rsp["success"], rows=len(rsp.get('data', [])), truncated=rsp.get('truncated', False))
+        return rsp
+
+def print_result(rsp):
+    if rsp["success"]:
+        if 'message' in rsp:
+            print(f"Query executed successfully. Rows affected: {rsp['message']}")
         else:
-            logger.error(f"Error executing query: {rsp['error']}")
+            table = tabulate(rsp['data'], headers=rsp['columns'], tablefmt='pretty')
+            print("Query results:")
+            print(table)
+            if rsp.get('truncated'):
+                print(f"Result truncated to the first {len(rsp['data'])} rows.")
+    else:
+        logger.error(f"Error executing query: {rsp['error']}")
+
+def run_candidate(index, query_context, database, cancellation, max_attempts) -> dict:
+    """
+    Generate one candidate SQL with its own sampling options and execute it, refining it after failures
+    up to max_attempts executions or until the race is canceled.
+
+    Only answers made of a single read-only statement are executed, as every candidate commits on its own
+    connection. Other answers are returned unexecuted with 'raceable' False and their 'llm_response',
+    to be run by the serial loop of the pipeline.
+    """
+    options = {
+        "temperature": index * float(os.getenv('PIPELINE_CANDIDATE_TEMPERATURE_STEP', '0.3')),
+        "seed": index,
+    }
+    improved_query = query_context['improved_query']
+    candidate = {'index': index, 'sql': None, 'rsp': {"success": False, "error": "No SQL generated"}, 'attempts': 0,
+                 'raceable': True, 'llm_response': None}
+    with telemetry.span("candidate", index=index, temperature=options['temperature']) as candidate_span:
+        try:
+            llm_response = traced("generate_sql_with_ollama", generate_sql_with_ollama, improved_query,
+                                  query_context['relevant_tables'], query_context['full_schema'], options=options,
+                                  cancel_event=cancellation.event)
+            candidate['llm_response'] = llm_response
+            extracted_sqls = extract_sql_from_markdown(llm_response['response'])
+            if extracted_sqls and not is_raceable(extracted_sqls):
+                candidate['raceable'] = False
+                extracted_sqls = []
+            while extracted_sqls and candidate['attempts'] < max_attempts and not cancellation.cancelled:
+                if candidate['attempts'] > 0:
+                    refined_response = traced("generate_refined_sql", generate_refined_sql,
+                                              user_query=improved_query,
+                                              initial_sql=candidate['sql'],
+                                              relevant_schema=query_context['relevant_tables'],
+                                              all_schema=query_context['full_schema'],
+                                              context=llm_response['context'],
+                                              error_message=candidate['rsp']["error"],
+                                              options=options,
+                                              cancel_event=cancellation.event)
+                    extracted_sqls = extract_sql_from_markdown(refined_response['response'])
+                    if not extracted_sqls or cancellation.cancelled:
+                        break
+                    if not is_raceable(extracted_sqls):
+                        candidate['rsp'] = {"success": False, "error": "The refined answer is not a single read-only statement"}
+                        break
+                candidate['sql'] = extracted_sqls[0]
+                candidate['attempts'] += 1
+                candidate['rsp'] = check_and_execute_sql(candidate['sql'], query_context['catalog'], database, cancellation)
+                if candidate['rsp']["success"]:
+                    break
+                logger.debug(f"Candidate {index} failed: {candidate['rsp']['error']}")
+        except Exception as e:
+            logger.error(f"Candidate {index} failed: {e}")
+            candidate['rsp'] = {"success": False, "error": str(e)}
+        candidate_span.set(success=candidate['rsp']["success"], attempts=candidate['attempts'],
+                           raceable=candidate['raceable'], cancelled=cancellation.cancelled)
+    return candidate
+
+def is_raceable(sqls) -> bool:
+    return len(sqls) == 1 and is_read_only_query(sqls[0])
+
+def race_candidates(query_context, database, candidates, selection='first', max_attempts=2):
+    """
+    Generate and execute several candidate SQLs concurrently, each sampled with a different temperature
+    and seed, and return the winning candidate, or None if none succeeded. As soon as a candidate answers
+    with statements that can't be raced (writes or several statements), the race is canceled and that
+    candidate is returned unexecuted, with 'raceable' False.
+
+    With the "first" selection the first successful candidate wins and the others are canceled, including
+    their running generations and queries. With "best" all candidates run to completion and the successful
+    candidate whose result is returned by the most candidates wins (earlier candidates win ties).
+    """
+    cancellation = QueryCancellation()
+    futures = [get_stage_executor().submit(telemetry.bind(run_candidate), index, query_context, database, cancellation, max_attempts)
+               for index in range(candidates)]
+    if selection == 'first':
+        winner = None
+        for future in as_completed(futures):
+            candidate = future.result()
+            if candidate['rsp']["success"] or not candidate['raceable']:
+                winner = candidate
+                break
+        cancellation.cancel()
+        return winner
+
+    results = [future.result() for future in futures]
+    unraceable = next((candidate for candidate in results if not candidate['raceable']), None)
+    if unraceable:
+        return unraceable
+    successful = [candidate for candidate in results if candidate['rsp']["success"]]
+    if not successful:
+        return None
+    votes = Counter(result_signature(candidate['rsp']) for candidate in successful)
+    return max(successful, key=lambda candidate: (votes[result_signature(candidate['rsp'])], -candidate['index']))
+
+def result_signature(rsp):
+    return repr((rsp.get('columns'), rsp.get('data'), rsp.get('message')))
+
+def execute_user_query_pipleline(query: str, verbose=True) -> dict:
+    """
+    Answer a question: generate SQL for it (or reuse the SQL of a similar question), validate and execute it,
+    refining it with the execution errors.
+
+    Args:
+    query (str): The user's natural language question.
+    verbose (bool): Print the generated SQL and the query results.
+
+    Returns:
+    dict: The 'question', whether it succeeded ('success'), the executed 'sql' statements, the 'source' of the
+    SQL ("semantic_cache", "generated" or "race"), the number of 'retries', the 'row_count' of the results,
+    the last 'error' and the 'timings' in seconds of the stages ('cache_lookup', 'prepare', 'generate',
+    'execute' and 'total').
+    """
+    with telemetry.span("pipeline", **({'question': query} if telemetry.log_questions() else {})) as pipeline_span:
+        result = answer_user_query(query, verbose)
+        pipeline_span.set(success=result['success'], source=result['source'], retries=result['retries'],
+                          rows=result['row_count'])
+    telemetry.count("questions_total", status="success" if result['success'] else "failed", source=result['source'])
+    telemetry.count("sql_retries_total", result['retries'])
+    telemetry.count("rows_returned_total", result['row_count'])
+    telemetry.write_metrics_file()
+    return result
+
+def answer_user_query(query: str, verbose=True) -> dict:
+    """
+    Run the stages of execute_user_query_pipleline within its span.
+    """
+    # todo: chnage the database name to the one in the data source
+    database = 'dvdrental'
+    started = time.perf_counter()
+    timings = {'cache_lookup': 0.0, 'prepare': 0.0, 'generate': 0.0, 'execute': 0.0}
+    result = {'question': query, 'success': False, 'sql': [], 'source': 'generated', 'retries': 0,
+              'row_count': 0, 'error': None, 'timings': timings}
+
+    def finish(rsps):
+        result['success'] = bool(rsps) and all(rsp["success"] for rsp in rsps)
+        result['row_count'] = sum(len(rsp.get('data', [])) for rsp in rsps)
+        result['error'] = next((rsp["error"] for rsp in rsps if not rsp["success"]), None)
+        timings['total'] = time.perf_counter() - started
+        return result
+
+    def timed(stage, span_name, func, *args, **kwargs):
+        # span_name is None for functions opening their own spans
+        stage_started = time.perf_counter()
+        try:
+            return traced(span_name, func, *args, **kwargs) if span_name else func(*args, **kwargs)
+        finally:
+            timings[stage] += time.perf_counter() - stage_started
+
+    def execute_sql(sql):
+        rsp = timed('execute', None, check_and_execute_sql, sql, catalog, database)
+        if verbose:
+            print_result(rsp)
         return rsp
-    
-    all_db_info = load_all_db_info(PROJECT_FOLDER)
-    all_schema = list()
-    for db_name, db_info in all_db_info.items():
-        for table_name, table_info in db_info["tables"].items():
-            all_schema.append(table_info_to_ddl(db_name, table_name, table_info))
-    improved_query = improve_prompt(query)
-    relevant_tables = fetch_relevant_tables_ddl(improved_query)
-    full_schema = f"\n".join(all_schema)
-    llm_response = generate_sql_with_ollama(improved_query, relevant_tables, full_schema)
-    print(f"Generated SQL for query: {llm_response['response']}")
+
+    semantic_cache = get_semantic_cache()
+    if semantic_cache:
+        cached, query_vector, cache_version = timed('cache_lookup', "lookup_cached_sql", lookup_cached_sql, query)
+        if cached:
+            if verbose:
+                print(f"Reusing SQL of the similar question: {cached['question']}")
+            rsps = [timed('execute', None, traced_execute_sql_query, database, sql) for sql in cached['sql']]
+            if verbose:
+                for rsp in rsps:
+                    print_result(rsp)
+            if all(rsp["success"] for rsp in rsps):
+                result.update(sql=cached['sql'], source='semantic_cache')
+                return finish(rsps)
+            logger.warning("Cached SQL failed, generating it again")
+            semantic_cache.invalidate(cached['id'])
+
+    query_context = timed('prepare', "prepare_query_context", prepare_query_context, query)
+    catalog = query_context['catalog']
+    improved_query = query_context['improved_query']
+    relevant_tables = query_context['relevant_tables']
+    full_schema = query_context['full_schema']
+
+    candidates = int(os.getenv('PIPELINE_CANDIDATES', '1'))
+    llm_response = None
+    if candidates > 1:
+        # racing mode: the candidates replace the serial retry loop below, unless they answer with writes
+        # or several statements, which are executed once by the serial loop
+        winner = timed('generate', "race_candidates", race_candidates, query_context, database, candidates,
+                       selection=os.getenv('PIPELINE_CANDIDATE_SELECTION', 'first'),
+                       max_attempts=int(os.getenv('PIPELINE_CANDIDATE_ATTEMPTS', '2')))
+        if winner is not None and not winner['raceable']:
+            logger.info(f"Candidate {winner['index']} answered with statements that can't be raced, executing them serially")
+            llm_response = winner['llm_response']
+        else:
+            result['source'] = 'race'
+            if winner is None:
+                logger.error(f"None of the {candidates} candidate queries succeeded.")
+                return finish([{"success": False, "error": f"None of the {candidates} candidate queries succeeded"}])
+            if verbose:
+                print(f"Generated SQL for query (candidate {winner['index']}): {winner['sql']}")
+                print_result(winner['rsp'])
+            result.update(sql=[winner['sql']], retries=winner['attempts'] - 1)
+            if semantic_cache:
+                # raced statements are always read-only
+                semantic_cache.store(query, query_vector, [winner['sql']], cache_version)
+            return finish([winner['rsp']])
+
+    if llm_response is None:
+        llm_response = timed('generate', "generate_sql_with_ollama", generate_sql_with_ollama,
+                             improved_query, relevant_tables, full_schema)
+    if verbose:
+        print(f"Generated SQL for query: {llm_response['response']}")
     extracted_sqls = extract_sql_from_markdown(llm_response['response'])
+    rsps = []
     for sql in extracted_sqls:
         retry_count = 0
         max_retries = 5
@@ -45,7 +371,8 @@ def execute_user_query_pipleline(query: str):
             if retry_count == 0:
                 rsp = execute_sql(current_sql)
             else:
-                improved_sql_query_response = generate_refined_sql(user_query=improved_query, 
+                improved_sql_query_response = timed('generate', "generate_refined_sql", generate_refined_sql,
+                                                    user_query=improved_query, 
                                                     initial_sql=current_sql,
                                                     relevant_schema=relevant_tables, 
                                                     all_schema=full_schema, 
@@ -53,9 +380,72 @@ def execute_user_query_pipleline(query: str):
                                                     error_message=rsp["error"])
                 logger.debug(f"Refined SQL: {improved_sql_query_response['response']}")
                 current_sql = extract_sql_from_markdown(improved_sql_query_response['response'])[0]
+                result['retries'] += 1
                 rsp = execute_sql(current_sql)
                 if not rsp["success"]:
                     logger.error(f"Error executing query: {rsp}")
             retry_count += 1
             if retry_count == max_retries and not rsp["success"]:
-                logger.error(f"Failed to execute query after {max_retries} attempts.")
\ No newline at end of file
+                logger.error(f"Failed to execute query after {max_retries} attempts.")
+        result['sql'].append(current_sql)
+        rsps.append(rsp)
+
+    if not extracted_sqls:
+        rsps.append({"success": False, "error": "No SQL found in the response of the model"})
+    finish(rsps)
+    if semantic_cache and result['success'] and all(is_read_only_query(sql) for sql in result['sql']):
+        semantic_cache.store(query, query_vector, result['sql'], cache_version)
+    return result
+
+def warm_up():
+    """
+    Load the resources shared by all pipeline runs (catalog, embedding model, vector store) up front.
+    """
+    catalog_future = get_stage_executor().submit(load_compiled_catalog, src.PROJECT_FOLDER)
+    get_model()
+    get_schema_vector_store()
+    catalog_future.result()
+
+def execute_user_query_batch(questions, concurrency=None, on_result=None) -> list[dict]:
+    """
+    Answer many questions in one process, running up to concurrency pipelines at a time over the shared,
+    warmed up resources.
+
+    Args:
+    questions (list): Dictionaries with a 'question' and optionally an 'id'. Questions with an 'error' set
+    by their reader, or failing with an exception, are reported as failed results.
+    concurrency (int): Maximum number of concurrent pipelines. Defaults to QUERY_BATCH_CONCURRENCY (4).
+    on_result (callable): Called with each result as soon as its question is answered.
+
+    Returns:
+    list: The results of execute_user_query_pipleline in the order of the questions, each with the 'id' of its question.
+    """
+    concurrency = concurrency or int(os.getenv('QUERY_BATCH_CONCURRENCY', '4'))
+    warm_up()
+
+    def answer(index, question):
+        try:
+            if question.get('error'):
+                raise ValueError(question['error'])
+            if not isinstance(question.get('question'), str):
+                raise ValueError("No 'question' string given")
+            result = execute_user_query_pipleline(question['question'], verbose=False)
+        except Exception as e:
+            logger.error(f"Question {question.get('id', index)} failed: {e}")
+            timings = {'cache_lookup': 0.0, 'prepare': 0.0, 'generate': 0.0, 'execute': 0.0, 'total': 0.0}
+            result = {'question': question.get('question'), 'success': False, 'sql': [], 'source': 'generated',
+                      'retries': 0, 'row_count': 0, 'error': str(e), 'timings': timings}
+        result['id'] = question.get('id', index)
+        return result
+
+    results = [None] * len(questions)
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="batch") as batch_executor:
+        futures = {batch_executor.submit(answer, index, question): index for index, question in enumerate(questions)}
+        for done, future in enumerate(as_completed(futures), start=1):
+            result = future.result()
+            results[futures[future]] = result
+            logger.info(f"Answered question {result['id']} [{done}/{len(questions)}]: "
+                        f"{'success' if result['success'] else 'failed'}")
+            if on_result:
+                on_result(result)
+    return results
@@ -0,0 +1,69 @@
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token count of a prompt section (about four characters per token for DDL-like text).
+    """
+    return (len(text) + 3) // 4
+
+def build_schema_context(catalog, seed_tables, max_hops=None, token_budget=None, include_seeds=True) -> dict:
+    """
+    Build the FULL_SCHEMA prompt section from the tables relevant to a question instead of the whole catalog.
+
+    Starting from the seed tables (in order of relevance), the foreign key graph of the compiled catalog is
+    expanded breadth-first in both directions, hop by hop, up to max_hops. Tables are added while the
+    estimated size stays within token_budget; the seed tables are always included, unless include_seeds is
+    False: the column index mode (SCHEMA_INDEX_MODE=column) already puts their trimmed DDL in the prompt,
+    and their full DDL would bring the wide tables back.
+
+    Args:
+    catalog (dict): The compiled catalog, as returned by load_compiled_catalog.
+    seed_tables (list): '<database>.<table>' keys of the tables returned by the schema search.
+    max_hops (int): Maximum foreign key distance from a seed table. Defaults to SCHEMA_CONTEXT_HOPS (2).
+    token_budget (int): Maximum estimated tokens of the section. Defaults to SCHEMA_CONTEXT_TOKEN_BUDGET (6000).
+    include_seeds (bool): Whether the DDL of the seed tables is part of the section.
+
+    Returns:
+    dict: The 'schema' DDL, the included 'tables', its estimated 'tokens', the 'full_tokens' of the
+    whole catalog and the 'saved_tokens'. Without seed tables the whole catalog is returned.
+    """
+    max_hops = max_hops if max_hops is not None else int(os.getenv('SCHEMA_CONTEXT_HOPS', '2'))
+    token_budget = token_budget or int(os.getenv('SCHEMA_CONTEXT_TOKEN_BUDGET', '6000'))
+    full_tokens = estimate_tokens(catalog['full_schema'])
+
+    seeds = [table_key for table_key in dict.fromkeys(seed_tables) if table_key in catalog['tables']]
+    if not seeds:
+        return {'schema': catalog['full_schema'], 'tables': list(catalog['tables']),
+                'tokens': full_tokens, 'full_tokens': full_tokens, 'saved_tokens': 0}
+
+    included = list(seeds) if include_seeds else []
+    visited = set(seeds)
+    tokens = sum(estimate_tokens(catalog['tables'][table_key]) for table_key in included)
+    frontier = seeds
+    for _ in range(max_hops):
+        next_frontier = []
+        for table_key in frontier:
+            for neighbour in catalog['relations'].get(table_key, []):
+                if neighbour in visited or neighbour not in catalog['tables']:
+                    continue
+                visited.add(neighbour)
+                table_tokens = estimate_tokens(catalog['tables'][neighbour])
+                if tokens + table_tokens > token_budget:
+                    continue
+                tokens += table_tokens
+                included.append(neighbour)
+                next_frontier.append(neighbour)
+        if not next_frontier:
+            break
+        frontier = next_frontier
+
+    schema = "\n".join(catalog['tables'][table_key] for table_key in included)
+    tokens = estimate_tokens(schema)
+    saved_tokens = max(full_tokens - tokens, 0)
+    logger.info(f"Schema context: {len(included)} of {len(catalog['tables'])} table(s), ~{tokens} tokens "
+                f"instead of ~{full_tokens} ({saved_tokens} saved, {saved_tokens * 100 // max(full_tokens, 1)}%)")
+    return {'schema': schema, 'tables': included, 'tokens': tokens,
+            'full_tokens': full_tokens, 'saved_tokens': saved_tokens}
@@ -0,0 +1,145 @@
+import re
+import difflib
+import logging
+import sqlglot
+from sqlglot import exp
+from sqlglot.errors import SqlglotError, OptimizeError
+from sqlglot.optimizer.qualify import qualify
+from sqlglot.schema import MappingSchema
+
+logger = logging.getLogger(__name__)
+
+UNRESOLVED_COLUMN_PATTERN = re.compile(r"Column '(?P<column>.+?)' could not be resolved(?: for table: '(?P<table>.+?)')?")
+UNKNOWN_COLUMN_PATTERN = re.compile(r"Unknown column: (?P<column>\S+)")
+SIMPLE_IDENTIFIER_PATTERN = re.compile(r"^[a-z_][a-z0-9_$]*$")
+
+def schema_identifier(name: str) -> str:
+    # sqlglot lowercases unquoted identifiers as Postgres does, names with other characters must stay quoted
+    return name if SIMPLE_IDENTIFIER_PATTERN.match(name) else '"' + name.replace('"', '""') + '"'
+
+def relation_name(table: exp.Table) -> str:
+    identifier = table.this
+    return table.name if getattr(identifier, 'quoted', False) else table.name.lower()
+
+def suggestion(name, candidates) -> str:
+    matches = difflib.get_close_matches(name, candidates, n=3, cutoff=0.6)
+    return f" Did you mean {', '.join(matches)}?" if matches else ""
+
+def is_catalog_relation(table: exp.Table) -> bool:
+    """
+    Whether the catalog covers the relation: a plain table name of the public schema. Table functions,
+    other schemas and the system relations Postgres resolves through pg_catalog or information_schema
+    (pg_tables, pg_stat_activity, ...) are outside of it.
+    """
+    if not isinstance(table.this, exp.Identifier) or table.args.get('catalog'):
+        return False
+    if table.args.get('db') and table.db.lower() != 'public':
+        return False
+    return not relation_name(table).startswith('pg_')
+
+def validate_sql(query: str, catalog: dict, database: str) -> list[str]:
+    """
+    Check the tables and columns referenced by a generated statement against the compiled catalog,
+    without contacting the database.
+
+    Only errors Postgres would raise as well are reported: unknown public tables, unknown or ambiguous
+    columns and references to table aliases missing from the FROM clause, including those of join conditions.
+    Statements that can't be parsed, or that read relations the catalog doesn't cover (system catalogs such
+    as pg_tables, information_schema, other schemas, table functions), are not rejected and left to Postgres.
+
+    Args:
+    query (str): The SQL statement(s) to check.
+    catalog (dict): The compiled catalog, as returned by load_compiled_catalog.
+    database (str): The database the statement is executed on.
+
+    Returns:
+    list: Error messages for the retry prompt, empty if no problem was found.
+    """
+    try:
+        statements = [statement for statement in sqlglot.parse(query, read='postgres') if statement is not None]
+    except SqlglotError as e:
+        logger.debug(f"Skipping the validation of a statement that can't be parsed: {e}")
+        return []
+
+    prefix = f"{database}."
+    errors = []
+    for statement in statements:
+        cte_names = {cte.alias_or_name for cte in statement.find_all(exp.CTE)}
+        schema = {}
+        missing = []
+        for table in statement.find_all(exp.Table):
+            name = relation_name(table)
+            if name in cte_names and not table.args.get('db'):
+                continue
+            if not is_catalog_relation(table):
+                logger.debug(f"Leaving the validation of a statement reading {table.sql(dialect='postgres')} to Postgres")
+                schema = None
+                break
+            table_key = prefix + name
+            if table_key not in catalog['columns']:
+                missing.append(name)
+                continue
+            schema[schema_identifier(name)] = {
+                schema_identifier(column): 'unknown' for column in catalog['columns'][table_key]
+            }
+        if schema is None:
+            continue
+        if missing:
+            known_tables = [key[len(prefix):] for key in catalog['columns'] if key.startswith(prefix)]
+            for name in dict.fromkeys(missing):
+                errors.append(f'relation "{name}" does not exist.{suggestion(name, known_tables)}')
+            continue
+        if not schema:
+            continue
+        try:
+            qualify(statement.copy(), schema=MappingSchema(schema, dialect='postgres'), dialect='postgres',
+                    validate_qualify_columns=True)
+        except OptimizeError as e:
+            error = column_error(str(e), statement, catalog, prefix)
+            if error:
+                errors.append(error)
+            else:
+                logger.debug(f"Leaving the validation to Postgres: {e}")
+        except SqlglotError as e:
+            logger.debug(f"Leaving the validation to Postgres: {e}")
+    return errors
+
+def column_error(message: str, statement, catalog: dict, prefix: str):
+    """
+    Turn a column resolution error of the qualifier into a Postgres-like message with suggestions,
+    or return None if the error isn't one the database would raise as well.
+    """
+    match = UNRESOLVED_COLUMN_PATTERN.search(message) or UNKNOWN_COLUMN_PATTERN.search(message)
+    if not match:
+        return None
+    column = match.group('column').strip('"')
+    table_name = match.groupdict().get('table')
+    aliases = {}
+    for table in statement.find_all(exp.Table):
+        if prefix + relation_name(table) in catalog['columns']:
+            aliases[table.alias_or_name] = relation_name(table)
+    derived = {source.alias for source in statement.find_all(exp.Subquery, exp.CTE) if source.alias}
+
+    if table_name:
+        if table_name in derived:
+            return None
+        if table_name not in aliases:
+            return f'missing FROM-clause entry for table "{table_name}".{suggestion(table_name, list(aliases))}'
+        columns = catalog['columns'][prefix + aliases[table_name]]
+        return f'column {table_name}.{column} does not exist.{suggestion(column, list(columns))}'
+
+    if derived:
+        # the column may come from a derived table the qualifier couldn't expand
+        return None
+    owners = [alias for alias, name in aliases.items() if column in catalog['columns'][prefix + name]]
+    if len(owners) > 1:
+        return f'column reference "{column}" is ambiguous, it exists in {", ".join(owners)}.'
+    if owners:
+        return None
+    candidates = {}
+    for alias, table in aliases.items():
+        for name in catalog['columns'][prefix + table]:
+            candidates.setdefault(name, f"{alias}.{name}")
+    matches = difflib.get_close_matches(column, list(candidates), n=3, cutoff=0.6)
+    hint = f" Did you mean {', '.join(candidates[match] for match in matches)}?" if matches else ""
+    return f'column "{column}" does not exist.{hint}'
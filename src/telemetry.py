@@ -0,0 +1,265 @@
+import os
+import json
+import time
+import uuid
+import atexit
+import logging
+import tempfile
+import threading
+import contextvars
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+logger = logging.getLogger(__name__)
+
+# Spans and metrics of the query pipeline.
+#   TELEMETRY=0                  disables both
+#   TELEMETRY_LOG_FILE           JSON lines file receiving every finished span ("-" for stderr)
+#   TELEMETRY_METRICS_FILE       Prometheus text file, rewritten after every pipeline run and at exit
+#   TELEMETRY_METRICS_PORT       port of a Prometheus /metrics endpoint started on first use
+#   TELEMETRY_METRICS_HOST       address the endpoint listens on, localhost by default
+#   TELEMETRY_LOG_QUESTIONS=1    adds the questions to the pipeline spans, left out by default
+METRIC_PREFIX = "cerebro_"
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+METRIC_HELP = {
+    "stage_duration_seconds": "Duration of the pipeline stages",
+    "llm_prompt_tokens_total": "Prompt tokens sent to the LLM",
+    "llm_completion_tokens_total": "Completion tokens generated by the LLM",
+    "llm_requests_total": "LLM generate requests",
+    "sql_retries_total": "Refinement retries of generated SQL",
+    "rows_returned_total": "Rows returned by the executed SQL",
+    "questions_total": "Questions answered by the pipeline",
+    "cache_hits_total": "Cache hits",
+    "cache_misses_total": "Cache misses",
+}
+
+_current_span = contextvars.ContextVar("cerebro_span", default=None)
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+_configured = False
+_span_logger = None
+_metrics_server = None
+
+def is_enabled() -> bool:
+    return os.getenv("TELEMETRY", "1") != "0"
+
+def configure():
+    """
+    Set up the exporters from the environment, once.
+    """
+    global _configured, _span_logger, _metrics_server
+    if _configured:
+        return
+    with _lock:
+        if _configured:
+            return
+        log_file = os.getenv("TELEMETRY_LOG_FILE")
+        if log_file:
+            _span_logger = logging.getLogger("cerebro.telemetry.spans")
+            _span_logger.propagate = False
+            _span_logger.setLevel(logging.INFO)
+            handler = logging.StreamHandler() if log_file == "-" else logging.FileHandler(log_file)
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            _span_logger.addHandler(handler)
+        port = os.getenv("TELEMETRY_METRICS_PORT")
+        if port:
+            # a failing exporter must not fail the stages it observes, the metrics stay available in the file
+            try:
+                _metrics_server = ThreadingHTTPServer((os.getenv("TELEMETRY_METRICS_HOST", "127.0.0.1"), int(port)),
+                                                      MetricsHandler)
+                _metrics_server.daemon_threads = True
+                threading.Thread(target=_metrics_server.serve_forever, name="metrics", daemon=True).start()
+                logger.info(f"Serving Prometheus metrics on port {_metrics_server.server_port}")
+            except (OSError, ValueError) as e:
+                logger.error(f"Failed to start the metrics endpoint on port {port}: {e}")
+        _configured = True
+
+class Span:
+    """
+    A timed stage of a pipeline run. Attributes set on it end up in its JSON log record.
+    """
+
+    def __init__(self, name, parent=None, attributes=None):
+        self.name = name
+        self.parent = parent
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.attributes = dict(attributes or {})
+        self.started_at = time.time()
+        self.started = time.perf_counter()
+        self.duration = None
+        self.error = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def add(self, **values):
+        """
+        Add to numeric attributes, e.g. the tokens of several LLM calls within the span.
+        """
+        for key, value in values.items():
+            if value is not None:
+                self.attributes[key] = self.attributes.get(key, 0) + value
+
+    def to_record(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent.span_id if self.parent else None,
+            "name": self.name,
+            "start": self.started_at,
+            "duration_ms": round(self.duration * 1000, 3),
+            "status": "error" if self.error else "ok",
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+@contextmanager
+def span(name, **attributes):
+    """
+    Time a stage as a child of the current span. The duration is recorded in the stage_duration_seconds
+    histogram and the finished span is written to the JSON span log.
+    """
+    if not is_enabled():
+        yield Span(name, attributes=attributes)
+        return
+    configure()
+    current = Span(name, parent=_current_span.get(), attributes=attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except Exception as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current_span.reset(token)
+        current.duration = time.perf_counter() - current.started
+        observe("stage_duration_seconds", current.duration, stage=name)
+        if _span_logger:
+            _span_logger.info(json.dumps(current.to_record(), default=str))
+
+def log_questions() -> bool:
+    return os.getenv("TELEMETRY_LOG_QUESTIONS", "0") == "1"
+
+def current_span():
+    return _current_span.get()
+
+def bind(func):
+    """
+    Wrap a function so it runs within the current span when called on another thread, e.g. by an executor.
+    """
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        return context.run(func, *args, **kwargs)
+    return run
+
+def count(name, value=1, **labels):
+    if not is_enabled() or not value:
+        return
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+def observe(name, value, **labels):
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = {"buckets": [0] * len(DURATION_BUCKETS), "sum": 0.0, "count": 0}
+        for i, bound in enumerate(DURATION_BUCKETS):
+            if value <= bound:
+                histogram["buckets"][i] += 1
+        histogram["sum"] += value
+        histogram["count"] += 1
+
+def record_llm_usage(model, prompt_tokens, completion_tokens):
+    """
+    Count the tokens of an LLM call, per model and stage (the current span), and add them to the current span.
+    """
+    current = current_span()
+    stage = current.name if current is not None else "none"
+    count("llm_requests_total", model=model, stage=stage)
+    count("llm_prompt_tokens_total", prompt_tokens or 0, model=model, stage=stage)
+    count("llm_completion_tokens_total", completion_tokens or 0, model=model, stage=stage)
+    if current is not None:
+        current.add(llm_calls=1, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+
+def record_cache(cache, hits, misses=0):
+    count("cache_hits_total", hits, cache=cache)
+    count("cache_misses_total", misses, cache=cache)
+
+def format_labels(labels, extra=()) -> str:
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + "}"
+
+def render_metrics() -> str:
+    """
+    Render all metrics in the Prometheus text exposition format.
+    """
+    with _lock:
+        counters = dict(_counters)
+        histograms = {key: {"buckets": list(value["buckets"]), "sum": value["sum"], "count": value["count"]}
+                      for key, value in _histograms.items()}
+    lines = []
+    described = set()
+
+    def describe(name, kind):
+        if name not in described:
+            described.add(name)
+            lines.append(f"# HELP {METRIC_PREFIX}{name} {METRIC_HELP.get(name, name)}")
+            lines.append(f"# TYPE {METRIC_PREFIX}{name} {kind}")
+
+    for (name, labels), value in sorted(counters.items()):
+        describe(name, "counter")
+        lines.append(f"{METRIC_PREFIX}{name}{format_labels(labels)} {value}")
+    for (name, labels), histogram in sorted(histograms.items()):
+        describe(name, "histogram")
+        for bound, bucket in zip(DURATION_BUCKETS, histogram["buckets"]):
+            lines.append(f"{METRIC_PREFIX}{name}_bucket{format_labels(labels, [('le', bound)])} {bucket}")
+        lines.append(f"{METRIC_PREFIX}{name}_bucket{format_labels(labels, [('le', '+Inf')])} {histogram['count']}")
+        lines.append(f"{METRIC_PREFIX}{name}_sum{format_labels(labels)} {histogram['sum']}")
+        lines.append(f"{METRIC_PREFIX}{name}_count{format_labels(labels)} {histogram['count']}")
+    return "\n".join(lines) + "\n"
+
+def write_metrics_file(path=None):
+    """
+    Write the metrics to TELEMETRY_METRICS_FILE (e.g. for the node exporter textfile collector), if configured.
+    """
+    path = path or os.getenv("TELEMETRY_METRICS_FILE")
+    if not path or not is_enabled():
+        return
+    text = render_metrics()
+    try:
+        with _lock:
+            fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", dir=os.path.dirname(os.path.abspath(path)))
+            try:
+                with os.fdopen(fd, "w") as f:
+                    f.write(text)
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+    except OSError as e:
+        logger.error(f"Failed to write the metrics file {path}: {e}")
+
+atexit.register(write_metrics_file)
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        data = render_metrics().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
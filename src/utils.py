@@ -2,6 +2,7 @@ import os
 import json
 import re
 import logging
+from src.catalog_store import LazyCatalog, write_binary_db_info, to_dict, BINARY_SUFFIX, JSON_SUFFIX
 
 logger = logging.getLogger(__name__)
 
@@ -64,13 +65,16 @@ def table_info_to_ddl(database_name: str, table_name: str, table_info: dict) ->
     ddl.append("\n".join(table_ddl))
     
     return "\n".join(ddl)
-def save_db_info(db_info, project_folder):
+def save_db_info(db_info, project_folder, export_json=False):
     """
     Create a data folder if it doesn't exist in the project folder.
-    Save the db_info dictionary in separate JSON files per database.
+    Save the db_info dictionary in separate binary catalog files per database,
+    optionally exporting each database as an indented JSON file as well.
     
     Args:
     db_info (dict): A dictionary containing database information.
+    project_folder (str): The path to the project folder.
+    export_json (bool): Whether to also write the <db>_info.json export.
     """
     # Create the data folder if it doesn't exist
     data_folder = os.path.join(project_folder, 'data')
@@ -78,19 +82,34 @@ def save_db_info(db_info, project_folder):
     
     # Iterate through each database in the db_info dictionary
     for db_name, db_data in db_info.items():
-        # Create a filename for the database
-        filename = f"{db_name}_info.json"
-        file_path = os.path.join(data_folder, filename)
-        
-        # Save the database information to a JSON file
-        with open(file_path, 'w') as f:
-            json.dump(db_data, f, indent=2)
-        
+        # Save the database information to a binary catalog file
+        file_path = os.path.join(data_folder, f"{db_name}{BINARY_SUFFIX}")
+        write_binary_db_info(db_data, file_path)
         logger.debug(f"Saved database info for {db_name} to {file_path}")
 
+        if export_json:
+            json_path = os.path.join(data_folder, f"{db_name}{JSON_SUFFIX}")
+            with open(json_path, 'w') as f:
+                json.dump(to_dict(db_data), f, indent=2)
+            logger.debug(f"Exported database info for {db_name} to {json_path}")
+
+def delete_db_info(db_name, project_folder):
+    """
+    Remove the saved database information of a database that no longer exists.
+
+    Args:
+    db_name (str): The name of the database to remove.
+    project_folder (str): The path to the project folder.
+    """
+    for suffix in (BINARY_SUFFIX, JSON_SUFFIX):
+        file_path = os.path.join(project_folder, 'data', f"{db_name}{suffix}")
+        if os.path.exists(file_path):
+            os.remove(file_path)
+            logger.debug(f"Removed database info for {db_name} from {file_path}")
+
 def load_db_info(db_name, project_folder):
     """
-    Load the database information from a previously saved JSON file in the data folder.
+    Load the database information from a previously saved file in the data folder.
 
     Args:
     db_name (str): The name of the database to load information for.
@@ -99,14 +118,10 @@ def load_db_info(db_name, project_folder):
     Returns:
     dict: The loaded database information, or None if the file doesn't exist.
     """
-    data_folder = os.path.join(project_folder, 'data')
-    filename = f"{db_name}_info.json"
-    file_path = os.path.join(data_folder, filename)
-
-    if os.path.exists(file_path):
-        with open(file_path, 'r') as f:
-            db_data = json.load(f)
-        logger.debug(f"Loaded database info for {db_name} from {file_path}")
+    catalog = LazyCatalog(os.path.join(project_folder, 'data'))
+    if db_name in catalog:
+        db_data = to_dict(catalog[db_name])
+        logger.debug(f"Loaded database info for {db_name}")
         return db_data
     else:
         logger.warning(f"No saved information found for database {db_name}")
@@ -114,36 +129,25 @@ def load_db_info(db_name, project_folder):
 
 def load_all_db_info(project_folder):
     """
-    Load all database information from previously saved JSON files in the data folder.
+    Load all database information from previously saved files in the data folder.
+    Databases and tables are read lazily: a database file is opened when it is first accessed
+    and a table is decoded when it is first accessed.
 
     Args:
     project_folder (str): The path to the project folder.
 
     Returns:
-    dict: A dictionary containing all loaded database information, with database names as keys.
+    Mapping: A read-only mapping of database names to database information.
     """
     data_folder = os.path.join(project_folder, 'data')
-    all_db_info = {}
-
     if not os.path.exists(data_folder):
-        print(f"Data folder not found at {data_folder}")
-        return all_db_info
-
-    for filename in os.listdir(data_folder):
-        if filename.endswith('_info.json'):
-            file_path = os.path.join(data_folder, filename)
-            db_name = filename.replace('_info.json', '')
-
-            with open(file_path, 'r') as f:
-                db_data = json.load(f)
-            
-            all_db_info[db_name] = db_data
-            print(f"Loaded database info for {db_name} from {file_path}")
+        logger.warning(f"Data folder not found at {data_folder}")
 
+    all_db_info = LazyCatalog(data_folder)
     if not all_db_info:
-        print("No database information files found in the data folder")
+        logger.warning("No database information files found in the data folder")
     else:
-        print(f"Loaded information for {len(all_db_info)} database(s)")
+        logger.debug(f"Found information for {len(all_db_info)} database(s)")
 
     return all_db_info
 